@@ -0,0 +1,139 @@
+import argparse
+import inspect
+import json
+from pathlib import Path
+
+import cv2
+import torch
+import torchvision
+import yaml
+
+from models.experimental import attempt_load, End2End, ORTModel, TorchScriptModel
+from utils.datasets import Preprocessor
+from utils.general import check_img_size, non_max_suppression
+
+
+def load_fused(weights):
+    # attempt_load() runs Model.fuse(): Conv+BN folding, RepConv reparameterization and IDetect implicit layers.
+    # fuse() updates parameters in place, which autograd refuses on training checkpoints unless grad is off
+    with torch.no_grad():
+        model = attempt_load(weights, device=torch.device('cpu'), fuse=True)
+    for p in model.parameters():
+        p.requires_grad = False
+    return model.eval()
+
+def load_frames(source):
+    paths = sorted(p for p in Path(source).iterdir() if p.suffix.lower() in ('.jpg', '.jpeg', '.png', '.bmp')) if Path(source).is_dir() else [Path(source)]
+    return [cv2.imread(str(p)) for p in paths]
+
+def export_torchscript(model, img, path, meta):
+    traced = torch.jit.trace(model, img, strict=False)
+    traced.save(str(path), _extra_files={'config.txt': json.dumps(meta)})
+    return path
+
+def export_onnx(model, img, path, meta, iou_thres, conf_thres, max_obj):
+    # End2End switches the detection head to end2end mode and appends the onnxruntime NMS
+    n_classes = model.model[-1].nc
+    end2end = End2End(model, max_obj=max_obj, iou_thres=iou_thres, score_thres=conf_thres, max_wh=max(img.shape[2:]), device=torch.device('cpu'), n_classes=n_classes)
+    kwargs = {'dynamo': False} if 'dynamo' in inspect.signature(torch.onnx.export).parameters else {}
+    torch.onnx.export(end2end, img, str(path), opset_version=12, do_constant_folding=True,
+                      input_names=['images'], output_names=['output'], **kwargs)
+    model.model[-1].end2end = False
+
+    try:
+        import onnx
+        onnx_model = onnx.load(str(path))
+        for key, value in meta.items():
+            prop = onnx_model.metadata_props.add()
+            prop.key, prop.value = key, str(value) if isinstance(value, (int, float)) else json.dumps(value)
+        onnx.save(onnx_model, str(path))
+    except ImportError:
+        print('[!] onnx is not installed, exported model has no metadata')
+    return path
+
+def match_detections(reference, candidate, iou=0.9):
+    # Fraction of reference boxes found in candidate with the same class and IoU >= iou, and the worst box offset
+    if len(reference) == 0:
+        return (1.0 if len(candidate) == 0 else 0.0), 0.0
+    if len(candidate) == 0:
+        return 0.0, float('inf')
+    ious = torchvision.ops.box_iou(reference[:, :4], candidate[:, :4])
+    ious[reference[:, 5:6] != candidate[:, 5:6].T] = 0
+    best, index = ious.max(1)
+    matched = best >= iou
+    offset = (reference[matched, :4] - candidate[index[matched], :4]).abs().max().item() if matched.any() else float('inf')
+    return matched.float().mean().item(), offset
+
+def verify(reference, outputs, name, min_recall=0.99, min_frame_recall=0.95, max_det=None):
+    # Recall averaged over all frames must reach min_recall; single frames only need min_frame_recall, since ties and
+    # float differences can flip a box or two at the thresholds between the exported NMS and the eager one
+    recalls = []
+    for i, (ref, out) in enumerate(zip(reference, outputs)):
+        ref = ref[:max_det]  # non_max_suppression() output is sorted by confidence
+        recall, offset = match_detections(ref, out)
+        print(f'[{"+" if recall >= min_frame_recall else "!"}] {name} frame {i}: {len(out)}/{len(ref)} boxes, recall {recall:.3f}, max offset {offset:.2f}px')
+        recalls.append(recall)
+    mean = sum(recalls) / max(len(recalls), 1)
+    ok = mean >= min_recall and all(recall >= min_frame_recall for recall in recalls)
+    print(f'[{"+" if ok else "!"}] {name}: mean recall {mean:.3f} over {len(recalls)} frames')
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description='Export fused YOLOv7 weights to ONNX (with NMS) and TorchScript for a fixed input shape')
+    parser.add_argument('--weights', default='best.weights')
+    parser.add_argument('--classes', default='classes.yaml')
+    parser.add_argument('--img-size', nargs='+', type=int, default=[640], help='input height [width]')
+    parser.add_argument('--conf-thres', type=float, default=0.25)
+    parser.add_argument('--iou-thres', type=float, default=0.45)
+    parser.add_argument('--max-obj', type=int, default=100, help='maximum detections per image kept by the embedded NMS (classes share one score channel)')
+    parser.add_argument('--output-dir', default=None, help='defaults to the directory of --weights')
+    parser.add_argument('--source', default='for_testing', help='image or directory of sample frames for verification')
+    parser.add_argument('--no-verify', action='store_true')
+    opt = parser.parse_args()
+
+    model = load_fused(opt.weights)
+    stride = int(model.stride.max())
+    img_size = [check_img_size(x, s=stride) for x in (opt.img_size * 2)[:2]]
+    names = [c['name'] for c in yaml.load(open(opt.classes), Loader=yaml.SafeLoader)['classes']]
+    meta = {'stride': stride, 'img_size': img_size, 'batch_size': 1, 'names': names}
+
+    output_dir = Path(opt.output_dir or Path(opt.weights).parent)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    stem = Path(opt.weights).stem
+
+    # eager reference outputs first, End2End changes the detection head
+    preprocessor = Preprocessor(tuple(img_size), torch.device('cpu'), stride=stride)
+    frames = [] if opt.no_verify else [f for f in load_frames(opt.source) if f is not None]
+    inputs = [preprocessor([frame], auto=False)[1].clone() for frame in frames]
+    with torch.no_grad():
+        reference = [non_max_suppression(model(img)[0], opt.conf_thres, opt.iou_thres)[0] for img in inputs]
+
+    img = torch.zeros((1, 3, *img_size))
+    with torch.no_grad():
+        model(img)  # builds the detection grids for this shape before tracing
+        ts_path = export_torchscript(model, img, output_dir / f'{stem}.torchscript', meta)
+        print(f'[+] TorchScript saved to {ts_path}')
+        onnx_path = export_onnx(model, img, output_dir / f'{stem}.onnx', meta, opt.iou_thres, opt.conf_thres, opt.max_obj)
+        print(f'[+] ONNX saved to {onnx_path}')
+
+    if opt.no_verify or len(frames) == 0:
+        return
+
+    ok = True
+    with torch.no_grad():
+        ts_model = TorchScriptModel(ts_path)
+        outputs = [non_max_suppression(ts_model(img)[0], opt.conf_thres, opt.iou_thres)[0] for img in inputs]
+        ok &= verify(reference, outputs, 'torchscript')
+        try:
+            ort_model = ORTModel(onnx_path)
+            outputs = [ort_model(img, opt.conf_thres)[0] for img in inputs]
+            ok &= verify(reference, outputs, 'onnx', max_det=opt.max_obj)
+        except ImportError:
+            print('[!] onnxruntime is not installed, skipping ONNX verification')
+
+    if not ok:
+        raise SystemExit('[!] exported models do not match the eager model')
+
+
+if __name__ == '__main__':
+    main()
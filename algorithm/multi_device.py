@@ -0,0 +1,137 @@
+import queue
+import threading
+from concurrent.futures import Future
+
+from algorithm.object_detector import YOLOv7
+from utils.torch_utils import select_devices
+
+
+class Replica:
+    # One YOLOv7 copy pinned to a device, fed by its own FIFO queue and worker thread
+    def __init__(self, detector, device):
+        self.detector = detector
+        self.device = device
+        self.queue = queue.Queue()
+        self.pending = 0  # frames queued or running, guarded by MultiDeviceDetector.lock
+        self.thread = threading.Thread(target=self.__run, daemon=True)
+        self.thread.start()
+
+    def __run(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            frames, track_ids, future, done = job
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(self.detector.detect_batch(frames, track_ids))
+                except Exception as e:
+                    future.set_exception(e)
+            done(len(frames))
+
+    def stop(self):
+        self.queue.put(None)
+        self.thread.join()
+
+
+class MultiDeviceDetector:
+    # Spreads frame batches over one YOLOv7 replica per device, picking the replica with the fewest pending frames.
+    # A tracked stream (track id) sticks to the replica that first saw it, so its tracker and OCR votes stay in one place
+    def __init__(self, devices=None, **settings):
+        self.devices = select_devices(devices)
+        self.settings = settings
+        self.config = {}  # set() calls, replayed on replicas created by a later load()
+        self.replicas = []
+        self.streams = {}  # track id -> replica
+        self.lock = threading.Lock()
+
+    def load(self, weights_path, classes, **load_options):
+        self.unload()
+        for device in self.devices:
+            detector = YOLOv7(**self.settings)
+            detector.set(**self.config)
+            detector.load(weights_path, classes, device=str(device), **load_options)
+            self.replicas.append(Replica(detector, device))
+
+    def unload(self):
+        for replica in self.replicas:
+            replica.stop()
+            replica.detector.unload()
+        self.replicas = []
+        self.streams = {}
+
+    def set(self, **config):
+        YOLOv7().set(**config)  # validates the keys even before load()
+        for replica in self.replicas:
+            replica.detector.set(**config)
+        self.config.update(config)
+
+    def __least_loaded(self):
+        return min(self.replicas, key=lambda replica: replica.pending)
+
+    def __route(self, track_ids):
+        # Groups frame indices by replica; untracked frames of one call go together to the least loaded replica
+        groups = {}
+        with self.lock:
+            free = self.__least_loaded()
+            for i, track_id in enumerate(track_ids):
+                if track_id is None:
+                    replica = free
+                else:
+                    if track_id not in self.streams:
+                        self.streams[track_id] = self.__least_loaded()
+                    replica = self.streams[track_id]
+                replica.pending += 1
+                groups.setdefault(id(replica), (replica, []))[1].append(i)
+        return groups.values()
+
+    def __done(self, replica):
+        def done(count):
+            with self.lock:
+                replica.pending -= count
+        return done
+
+    def submit(self, frames, track_ids=None):
+        # Returns a Future with the detect_batch() result for frames, in their order
+        if len(self.replicas) == 0:
+            raise Exception('no model loaded, call load() first')
+        if track_ids is not None and len(track_ids) != len(frames):
+            raise Exception(f'got {len(track_ids)} track ids for {len(frames)} frames')
+
+        result = Future()
+        if len(frames) == 0:
+            result.set_result([])
+            return result
+
+        groups = list(self.__route(track_ids if track_ids is not None else [None] * len(frames)))
+        detections = [None] * len(frames)
+        remaining = [len(groups)]
+        lock = threading.Lock()
+
+        def collect(indices, future):
+            with lock:
+                if result.done():
+                    return
+                if future.exception() is not None:
+                    result.set_exception(future.exception())
+                    return
+                for i, detection in zip(indices, future.result()):
+                    detections[i] = detection
+                remaining[0] -= 1
+                if remaining[0] == 0:
+                    result.set_result(detections)
+
+        for replica, indices in groups:
+            future = Future()
+            future.add_done_callback(lambda f, indices=indices: collect(indices, f))
+            group_ids = [track_ids[i] for i in indices] if track_ids is not None else None
+            replica.queue.put(([frames[i] for i in indices], group_ids, future, self.__done(replica)))
+        return result
+
+    def detect_batch(self, frames, track_ids=None):
+        return self.submit(frames, track_ids).result()
+
+    def release_stream(self, track_id):
+        # Forgets the replica binding of a finished stream, the next frames with this id are routed afresh
+        with self.lock:
+            self.streams.pop(track_id, None)
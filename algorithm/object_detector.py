@@ -1,12 +1,21 @@
 import warnings
 warnings.filterwarnings('ignore')
-from utils.general import check_img_size, non_max_suppression, scale_coords, crop
-from models.experimental import attempt_load
-from utils.torch_utils import select_device
+from utils.general import check_img_size, non_max_suppression_fast, detections_to_numpy, crop
+from models.experimental import attempt_load, ORTModel, TorchScriptModel
+from utils.torch_utils import select_device, set_affinity, pinned
 from utils.detections import Detections
-from utils.datasets import letterbox
+from utils.ocr_cache import OCRCache
+from utils.ocr_pool import OCRWorkerPool, read_texts
+from utils import ocr
+from utils.datasets import Preprocessor
+from utils.model_cache import load_fused_model
+from utils.quantization import load_calibration_frames, quantize_model
+from utils.profiling import Profiler
 from byte_tracker import BYTETracker
-import numpy as np
+from byte_tracker.track_archive import TrackArchive
+from functools import partial
+import threading
+import time
 import torch
 import yaml
 
@@ -17,32 +26,98 @@ class YOLOv7:
             'conf_thres':conf_thres,
             'iou_thres':iou_thres,
             'img_size':img_size,
-            'ocr_classes':ocr_classes
+            'max_det':300,
+            'classes':None,
+            'topk':None,
+            'ocr_classes':ocr_classes,
+            'copy_input':False,
+            'ocr_interval':10,
+            'ocr_growth':1.5,
+            'ocr_detect_text':True,
+            'ocr_recognize_only_classes':['tablica'],  # single-line crops (plates) skip text detection and are read as one batch
+            'ocr_async':False,
+            'ocr_workers':1,
+            'ocr_max_pending':None,  # OCR batches queued or running at once (default two per worker), later crops are skipped
+            'ocr_processes':False
         }
-        self.tracker = BYTETracker()
+        self.profiler = Profiler()  # profiler.enable() records per-stage timings of detect and the trackers
+        self.tracker = BYTETracker(profiler=self.profiler)
+        self.trackers = {}
+        self.track_archive = None
         self.text_recognizer = None
+        self.ocr_cache = OCRCache()
+        self.ocr_pool = None
+        self.text_callback = None
+        self.affinity = None
+        self.pinned_threads = set()
 
-    def load(self, weights_path, classes, ocr_weights=None, device='cpu'):
-        with torch.no_grad():
-            self.device = select_device(device)
-            self.model = attempt_load(weights_path, device=self.device)
-            
-            if device != 'cpu':
-                self.model.half()
-                self.model.to(self.device).eval()
+    def load(self, weights_path, classes, ocr_weights=None, device='cpu', ocr_backend=None, ocr_warmup=True, ocr_warmup_background=False, model_cache=None, mmap=False, quantize=None, calibration_frames=32,
+             threads=None, interop_threads=None, affinity=None, channels_last=False):
+        # model_cache: directory for the fused model keyed by the weights hash, skips torch.load of the
+        # training checkpoint and fuse() on later starts; mmap maps the cached weights instead of reading them.
+        # quantize: directory of frames to calibrate static INT8 Conv layers on, CPU only (see algorithm/quantize.py).
+        # threads/interop_threads size torch's thread pools (and the onnxruntime session's for .onnx weights);
+        # affinity confines inference to those cores: the thread pools started while loading and every thread that
+        # calls detect are pinned, the caller gets its own cores back (so the GUI thread keeps them);
+        # channels_last stores conv activations as NHWC
+        with torch.no_grad(), pinned(affinity):
+            self.device = select_device(device, threads=threads, interop_threads=interop_threads)
+            self.affinity = affinity
+            self.pinned_threads = set()
+            # artifacts from algorithm/export.py: .onnx already contains NMS and runs through onnxruntime,
+            # .torchscript is the pre-fused traced model; both keep the input shape they were exported with
+            self.end2end = str(weights_path).endswith('.onnx')
+            exported = self.end2end or str(weights_path).endswith('.torchscript')
+            half = False
+
+            if self.end2end:
+                self.model = ORTModel(weights_path, device=self.device, threads=threads, interop_threads=interop_threads)
+            elif exported:
+                self.model = TorchScriptModel(weights_path, device=self.device)
+            else:
+                if model_cache is not None:
+                    self.model = load_fused_model(weights_path, self.device, model_cache, mmap=mmap)
+                else:
+                    self.model = attempt_load(weights_path, device=self.device)
+
+                if channels_last:
+                    self.model.to(memory_format=torch.channels_last)
+
+                if quantize is not None:
+                    if self.device.type != 'cpu':
+                        raise Exception('INT8 quantization is only available for CPU inference')
+                    stride = int(self.model.stride.max())
+                    frames = load_calibration_frames(quantize, calibration_frames)
+                    self.model = quantize_model(self.model, frames, check_img_size(self.settings['img_size'], s=stride), stride)
+                elif device != 'cpu':
+                    half = True
+                    self.model.half()
+                    self.model.to(self.device).eval()
 
             stride = int(self.model.stride.max())
-            self.imgsz = check_img_size(self.settings['img_size'], s=stride)
+            self.fixed_shape = exported and self.model.img_size is not None
+            self.imgsz = self.model.img_size if self.fixed_shape else check_img_size(self.settings['img_size'], s=stride)
+            self.preprocessor = Preprocessor(self.imgsz, self.device, half=half, stride=stride, channels_last=channels_last and not exported)
             self.classes = yaml.load(open(classes), Loader=yaml.SafeLoader)['classes']
         
-        if len(self.settings['ocr_classes']) > 0 and ocr_weights is not None:
-            from easy_paddle_ocr import TextRecognizer
-            self.text_recognizer = TextRecognizer(weights=ocr_weights, device=device)
-        else:
-            from utils import ocr
-            self.text_recognizer = ocr
+        # backends import their OCR library lazily, so building one here costs nothing until it is used
+        if ocr_backend is None:
+            ocr_backend = 'easy_paddle' if ocr_weights is not None else 'paddle'
+        backend_options = {'weights':ocr_weights, 'device':device} if ocr_backend == 'easy_paddle' else {}
+        self.recognizer_factory = partial(ocr.create_backend, ocr_backend, **backend_options)
+        self.text_recognizer = self.recognizer_factory()
+
+        if ocr_warmup and len(self.settings['ocr_classes']) > 0:
+            if self.settings['ocr_async']:
+                self.__get_ocr_pool().warmup(background=ocr_warmup_background)
+            else:
+                self.text_recognizer.warmup(background=ocr_warmup_background)
 
     def unload(self):
+        self.set_track_archive(None)
+        if self.ocr_pool is not None:
+            self.ocr_pool.shutdown(wait=False)
+            self.ocr_pool = None
         if self.device.type != 'cpu':
             torch.cuda.empty_cache()
 
@@ -53,47 +128,188 @@ class YOLOv7:
             else:
                 raise Exception(f'{key} is not a valid inference setting')
 
-    def __parse_image(self, img):
-        im0 = img.copy()
-        img = letterbox(im0, self.imgsz, auto=self.imgsz != 1280)[0]
-        img = img[:, :, ::-1].transpose(2, 0, 1)
-        img = np.ascontiguousarray(img)
-        img = torch.from_numpy(img).to(self.device)
-        img = img.half() if self.device.type != 'cpu' else img.float()
-        img /= 255.0
+    def set_text_callback(self, callback):
+        # callback(detection) is called from an OCR worker once a background read has filled detection['text']
+        self.text_callback = callback
 
-        if img.ndimension() == 3:
-            img = img.unsqueeze(0)
+    def set_track_archive(self, path):
+        # Finished tracks of every stream are appended to this JSON Lines file for auditing, None stops archiving
+        if self.track_archive is not None:
+            self.track_archive.close()
+        self.track_archive = TrackArchive(path) if path is not None else None
+        for tracker in [self.tracker] + list(self.trackers.values()):
+            tracker.archive = self.track_archive
 
-        return im0, img
+    def __get_ocr_pool(self):
+        if self.ocr_pool is None:
+            self.ocr_pool = OCRWorkerPool(self.recognizer_factory, workers=self.settings['ocr_workers'], processes=self.settings['ocr_processes'],
+                                          max_pending=self.settings['ocr_max_pending'])
+        return self.ocr_pool
 
-    def detect(self, img, track=False):
-        with torch.no_grad():
-            im0, img = self.__parse_image(img)
+    def __parse_images(self, images):
+        # frames of different resolutions are letterboxed to the full square so they can be stacked
+        auto = not self.fixed_shape and self.imgsz != 1280 and len(set(image.shape for image in images)) == 1
+        return self.preprocessor(images, auto=auto, copy=self.settings['copy_input'])
+
+    def __pin_thread(self):
+        # Must run before the thread's first torch op, which starts its OpenMP pool (the preprocessor already uses it)
+        if self.affinity is not None and threading.get_ident() not in self.pinned_threads:
+            set_affinity(self.affinity)
+            self.pinned_threads.add(threading.get_ident())
+
+    def __infer(self, img):
+        classes = self.__class_indices()
+        if self.end2end:  # NMS is inside the exported graph, only the class filter can still be applied
+            with self.profiler.stage('forward'):
+                pred = self.model(img, self.settings['conf_thres'])
+            return pred if classes is None else [det[(det[:, 5:6] == torch.tensor(classes, device=det.device)).any(1)] for det in pred]
+        with self.profiler.stage('forward'):  # on CUDA this is mostly launch time, the wait shows up in nms
             pred = self.model(img)[0]
-            pred = non_max_suppression(pred, self.settings['conf_thres'], self.settings['iou_thres'])
-            raw_detection = np.empty((0,6), float)
-
-            for det in pred:
-                if len(det) > 0:
-                    det[:, :4] = scale_coords(img.shape[2:], det[:, :4], im0.shape).round()
-                    for *xyxy, conf, cls in reversed(det):
-                        raw_detection = np.concatenate((raw_detection, [[int(xyxy[0]), int(xyxy[1]), int(xyxy[2]), int(xyxy[3]), round(float(conf), 2), int(cls)]]))
-
-            if track:
-                raw_detection = self.tracker.update(raw_detection)
-            
-            detections = Detections(raw_detection, self.classes, tracking=track).to_dict()
-
-            if len(self.settings['ocr_classes']) > 0 and self.text_recognizer is not None:
-                for detection in detections:
-                    if detection['class'] in self.settings['ocr_classes']:
-                        cropped_box = crop(im0, detection)
-                        text = ''
-                        try:
-                            text = self.text_recognizer.read(cropped_box)['text']
-                        except:
-                            pass
-                        detection['text'] = text
-            
-            return detections
\ No newline at end of file
+        with self.profiler.stage('nms'):
+            return non_max_suppression_fast(pred, self.settings['conf_thres'], self.settings['iou_thres'], classes=classes,
+                                            max_det=self.settings['max_det'], topk=self.settings['topk'])
+
+    def __class_indices(self):
+        # 'classes' setting holds class names, NMS filters on their indices in classes.yaml
+        if self.settings['classes'] is None:
+            return None
+        names = [c['name'] for c in self.classes]
+        for name in self.settings['classes']:
+            if name not in names:
+                raise Exception(f'{name} is not a class of the loaded model')
+        return [names.index(name) for name in self.settings['classes']]
+
+    def __get_tracker(self, track_id):
+        if track_id not in self.trackers:
+            self.trackers[track_id] = BYTETracker(profiler=self.profiler, archive=self.track_archive, name=track_id)
+        return self.trackers[track_id]
+
+    def __process_detection(self, det, img_shape, im0, tracker=None):
+        with self.profiler.stage('postprocess'):
+            raw_detection = detections_to_numpy(det, img_shape, im0.shape)
+
+        if tracker is not None:
+            with self.profiler.stage('track'):
+                raw_detection = tracker.update(raw_detection)
+            self.ocr_cache.evict(tracker.removed_ids)
+
+        with self.profiler.stage('format'):
+            return Detections(raw_detection, self.classes, tracking=tracker is not None).to_dict()
+
+    def __recognize_texts(self, frames):
+        # frames: (detections, im0) pairs; every crop that needs OCR goes to the recognizer in one batch
+        if len(self.settings['ocr_classes']) == 0 or self.text_recognizer is None:
+            return
+
+        pending = []
+        for detections, im0 in frames:
+            for detection in detections:
+                if detection['class'] in self.settings['ocr_classes']:
+                    track_id = detection.get('id')
+                    area = detection['width'] * detection['height']
+                    if track_id is not None and not self.ocr_cache.needs_read(track_id, area, self.settings['ocr_interval'], self.settings['ocr_growth']):
+                        detection['text'] = self.ocr_cache.get(track_id)
+                    elif area > 0:
+                        pending.append((detection, crop(im0, detection), area))
+                    else:
+                        detection['text'] = ''
+
+        for detect_text, group in self.__split_by_detect_text(pending):
+            if self.settings['ocr_async']:
+                self.__submit_texts(group, detect_text)
+                continue
+
+            results = read_texts(self.text_recognizer, [cropped_box for _, cropped_box, _ in group], detect_text)
+            self.__apply_texts(group, results)
+
+    def __split_by_detect_text(self, pending):
+        # (detect_text, crops) groups: recognize-only classes go to the recognizer together, the rest run text detection
+        recognize_only = [item for item in pending if item[0]['class'] in self.settings['ocr_recognize_only_classes']]
+        detect = [item for item in pending if item[0]['class'] not in self.settings['ocr_recognize_only_classes']]
+        return [(detect_text, group) for detect_text, group in ((False, recognize_only), (self.settings['ocr_detect_text'], detect)) if len(group) > 0]
+
+    def __apply_texts(self, pending, results, background=False):
+        for (detection, _, area), result in zip(pending, results):
+            text = result['text']
+            track_id = detection.get('id')
+            if track_id is not None:
+                if background:
+                    self.ocr_cache.resolve(track_id, text, result.get('confidence', 1.0), area)
+                else:
+                    self.ocr_cache.update(track_id, text, result.get('confidence', 1.0), area)
+                text = self.ocr_cache.get(track_id)
+            detection['text'] = text
+            if background and self.text_callback is not None:
+                self.text_callback(detection)
+
+    def __submit_texts(self, pending, detect_text):
+        # detections go back right away with the best text known so far; the pool fills them in later.
+        # While the pool is full the batch is skipped: tracked crops are read on a later frame, untracked ones not at all
+        track_ids = [detection.get('id') for detection, _, _ in pending]
+        for (detection, _, _), track_id in zip(pending, track_ids):
+            detection['text'] = self.ocr_cache.get(track_id) if track_id is not None else ''
+            if track_id is not None:
+                self.ocr_cache.mark_pending(track_id)
+
+        future = self.__get_ocr_pool().submit([cropped_box for _, cropped_box, _ in pending], detect_text)
+        if future is None:
+            for track_id in track_ids:
+                if track_id is not None:
+                    self.ocr_cache.clear_pending(track_id)
+            return
+        submitted = time.perf_counter()
+
+        def on_done(future):
+            if self.profiler.enabled:
+                self.profiler.record('ocr.background', time.perf_counter() - submitted)
+            try:
+                results = future.result()
+            except:
+                results = [{'text':''} for _ in pending]
+            self.__apply_texts(pending, results, background=True)
+
+        future.add_done_callback(on_done)
+
+    def detect(self, img, track=False):
+        self.__pin_thread()
+        with torch.no_grad(), self.profiler.stage('detect'):
+            with self.profiler.stage('preprocess'):
+                im0s, img = self.__parse_images([img])
+            pred = self.__infer(img)
+            detections = self.__process_detection(pred[0], img.shape[2:], im0s[0], self.tracker if track else None)
+            with self.profiler.stage('ocr'):
+                self.__recognize_texts([(detections, im0s[0])])
+            return detections
+
+    def predict_tracks(self, track_id=None):
+        # Kalman-predicted tracks for a frame the detector skipped; track_id selects a detect_batch stream
+        tracker = self.tracker if track_id is None else self.__get_tracker(track_id)
+        detections = Detections(tracker.predict(), self.classes, tracking=True).to_dict()
+        for detection in detections:
+            if detection['class'] in self.settings['ocr_classes']:
+                detection['text'] = self.ocr_cache.get(detection['id'])
+        return detections
+
+    def detect_batch(self, frames, track_ids=None):
+        # track_ids[i] names the stream (e.g. camera) of frames[i]; each stream keeps its own tracker, None disables tracking
+        if len(frames) == 0:
+            return []
+
+        if track_ids is not None and len(track_ids) != len(frames):
+            raise Exception(f'got {len(track_ids)} track ids for {len(frames)} frames')
+
+        self.__pin_thread()
+        with torch.no_grad(), self.profiler.stage('detect_batch'):
+            with self.profiler.stage('preprocess'):
+                im0s, img = self.__parse_images(frames)
+            pred = self.__infer(img)
+            detections = []
+
+            for i, (det, im0) in enumerate(zip(pred, im0s)):
+                track_id = track_ids[i] if track_ids is not None else None
+                tracker = self.__get_tracker(track_id) if track_id is not None else None
+                detections.append(self.__process_detection(det, img.shape[2:], im0, tracker))
+
+            with self.profiler.stage('ocr'):
+                self.__recognize_texts(list(zip(detections, im0s)))
+            return detections
@@ -0,0 +1,68 @@
+import argparse
+import json
+import time
+
+import torch
+
+from algorithm.export import load_fused, match_detections
+from utils.datasets import Preprocessor
+from utils.general import check_img_size, non_max_suppression
+from utils.quantization import load_calibration_frames, quantize_model
+
+
+def run(model, inputs, conf_thres, iou_thres):
+    detections, latencies = [], []
+    with torch.no_grad():
+        model(inputs[0])  # warm-up
+        for img in inputs:
+            start = time.perf_counter()
+            detections.append(non_max_suppression(model(img)[0], conf_thres, iou_thres)[0])
+            latencies.append(time.perf_counter() - start)
+    return detections, sum(latencies) / len(latencies)
+
+def accuracy_report(fp32_model, int8_model, inputs, conf_thres=0.25, iou_thres=0.45, match_iou=0.5):
+    # Agreement of INT8 detections with the FP32 ones: recall/precision of boxes matched with the same class at match_iou.
+    # FP32 detections stand in for ground truth, so recall and precision here bound the mAP loss from quantization
+    reference, fp32_latency = run(fp32_model, inputs, conf_thres, iou_thres)
+    candidate, int8_latency = run(int8_model, inputs, conf_thres, iou_thres)
+
+    recalls = [match_detections(ref, out, match_iou)[0] for ref, out in zip(reference, candidate)]
+    precisions = [match_detections(out, ref, match_iou)[0] for ref, out in zip(reference, candidate)]
+    return {
+        'frames': len(inputs),
+        'fp32_boxes': sum(len(d) for d in reference),
+        'int8_boxes': sum(len(d) for d in candidate),
+        'recall': sum(recalls) / len(recalls),
+        'precision': sum(precisions) / len(precisions),
+        'fp32_ms': fp32_latency * 1000,
+        'int8_ms': int8_latency * 1000,
+        'speedup': fp32_latency / int8_latency,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Static INT8 quantization of YOLOv7 Conv layers for CPU inference')
+    parser.add_argument('--weights', default='best.weights')
+    parser.add_argument('--calibration', required=True, help='directory of gate frames used to calibrate activation ranges')
+    parser.add_argument('--eval', default=None, help='directory of frames for the accuracy report, defaults to --calibration')
+    parser.add_argument('--limit', type=int, default=None, help='maximum number of frames taken from each directory')
+    parser.add_argument('--img-size', type=int, default=640)
+    parser.add_argument('--conf-thres', type=float, default=0.25)
+    parser.add_argument('--iou-thres', type=float, default=0.45)
+    parser.add_argument('--threads', type=int, default=None)
+    opt = parser.parse_args()
+
+    if opt.threads:
+        torch.set_num_threads(opt.threads)
+    model = load_fused(opt.weights)
+    stride = int(model.stride.max())
+    img_size = check_img_size(opt.img_size, s=stride)
+
+    int8_model = quantize_model(model, load_calibration_frames(opt.calibration, opt.limit), img_size, stride)
+    preprocessor = Preprocessor(img_size, torch.device('cpu'), stride=stride)
+    frames = load_calibration_frames(opt.eval or opt.calibration, opt.limit)
+    inputs = [preprocessor([frame], auto=False)[1].clone() for frame in frames]
+    print(json.dumps(accuracy_report(model, int8_model, inputs, opt.conf_thres, opt.iou_thres), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+import argparse
+import itertools
+import json
+import os
+import subprocess
+import sys
+import time
+
+import cv2
+
+# Every configuration runs in a fresh process: inter-op threads can only be set once and affinity is inherited
+
+
+def parse_cores(spec):
+    # '0-3,6' -> [0, 1, 2, 3, 6]
+    cores = []
+    for part in spec.split(','):
+        start, _, end = part.partition('-')
+        cores.extend(range(int(start), int(end or start) + 1))
+    return cores
+
+def run_config(opt):
+    from algorithm.object_detector import YOLOv7
+
+    yolov7 = YOLOv7(img_size=opt.img_size)
+    yolov7.load(opt.weights, classes=opt.classes, device='cpu', threads=opt.threads, interop_threads=opt.interop_threads,
+                affinity=parse_cores(opt.cores) if opt.cores else None, channels_last=opt.channels_last)
+    frame = cv2.imread(opt.image)
+    for _ in range(opt.warmup):
+        yolov7.detect(frame)
+
+    latencies = []
+    for _ in range(opt.iterations):
+        start = time.perf_counter()
+        yolov7.detect(frame)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    print(json.dumps({
+        'threads': opt.threads, 'interop_threads': opt.interop_threads, 'cores': opt.cores, 'channels_last': opt.channels_last,
+        'mean_ms': sum(latencies) / len(latencies) * 1000, 'p50_ms': latencies[len(latencies) // 2] * 1000,
+    }))
+
+def main():
+    parser = argparse.ArgumentParser(description='Find the fastest CPU thread/affinity/memory-format setting for YOLOv7.detect')
+    parser.add_argument('--weights', default='best.weights')
+    parser.add_argument('--classes', default='classes.yaml')
+    parser.add_argument('--image', default='for_testing/1.jpg')
+    parser.add_argument('--img-size', type=int, default=640)
+    parser.add_argument('--threads', type=int, nargs='+', default=None, help='intra-op thread counts to try, default 1, 2, 4, ... up to the core count')
+    parser.add_argument('--interop-threads', type=int, nargs='+', default=[1, 2])
+    parser.add_argument('--cores', nargs='+', default=[None], help="core sets to pin to, e.g. '0-3' '4-7'")
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--channels-last', action='store_true', help=argparse.SUPPRESS)
+    opt = parser.parse_args()
+
+    if opt.worker:
+        opt.threads, opt.interop_threads, opt.cores = opt.threads[0], opt.interop_threads[0], opt.cores[0]
+        return run_config(opt)
+
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+    threads = opt.threads or sorted({min(2 ** i, cpus) for i in range(cpus.bit_length() + 1)})
+    common = ['--weights', opt.weights, '--classes', opt.classes, '--image', opt.image, '--img-size', str(opt.img_size),
+              '--warmup', str(opt.warmup), '--iterations', str(opt.iterations), '--worker']
+
+    results = []
+    for n, interop, cores, channels_last in itertools.product(threads, opt.interop_threads, opt.cores, (False, True)):
+        args = common + ['--threads', str(n), '--interop-threads', str(interop)]
+        args += ['--cores', cores] if cores else []
+        args += ['--channels-last'] if channels_last else []
+        output = subprocess.run([sys.executable, '-m', 'benchmarks.cpu_threads'] + args, capture_output=True, text=True)
+        if output.returncode != 0:
+            print(f'[!] threads={n} interop={interop} cores={cores} channels_last={channels_last} failed:\n{output.stderr}')
+            continue
+        result = json.loads(output.stdout.strip().splitlines()[-1])
+        print(f"threads={n:<3} interop={interop:<3} cores={cores or 'all':<8} channels_last={channels_last!s:<6} "
+              f"mean {result['mean_ms']:.1f}ms p50 {result['p50_ms']:.1f}ms")
+        results.append(result)
+
+    if results:
+        best = min(results, key=lambda r: r['p50_ms'])
+        print(f'[+] Best setting: {json.dumps(best)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+import argparse
+import json
+import sys
+import timeit
+
+import numpy as np
+
+from byte_tracker import matching
+
+# Micro-benchmark of the IoU matrix used by BYTETracker association: the NumPy kernel against cython_bbox's
+# compiled bbox_overlaps, which matching.ious picks up when it is installed:
+#   python -m benchmarks.iou --sizes 5 20 50 300
+
+
+def boxes(n, rng):
+    # n boxes of 10-80 px spread over a 640x640 frame, some of them overlapping
+    xy = rng.uniform(0, 600, (n, 2))
+    return np.column_stack((xy, xy + rng.uniform(10, 80, (n, 2))))
+
+def main():
+    parser = argparse.ArgumentParser(description='Time matching.numpy_ious against cython_bbox.bbox_overlaps')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[5, 20, 50, 100, 300], help='tracks x detections')
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    opt = parser.parse_args()
+
+    if matching.bbox_overlaps is None:
+        print('[!] cython_bbox is not installed, timing the NumPy kernel only', file=sys.stderr)
+
+    rng = np.random.default_rng(opt.seed)
+    results = []
+    for n in opt.sizes:
+        a, b = boxes(n, rng), boxes(n, rng)
+        timings = {'numpy': lambda: matching.numpy_ious(a, b), 'ious': lambda: matching.ious(a, b)}
+        if matching.bbox_overlaps is not None:
+            assert np.array_equal(matching.bbox_overlaps(a, b), matching.numpy_ious(a, b)), 'numpy_ious disagrees with bbox_overlaps'
+            timings['cython_bbox'] = lambda: matching.bbox_overlaps(a, b)
+
+        iterations = max(10, opt.iterations * 20 // max(n, 20))
+        us = {name: min(timeit.repeat(fn, number=iterations, repeat=3)) / iterations * 1e6 for name, fn in timings.items()}
+        results.append({'size': n, 'us': us})
+        print(f"{n:>4}x{n:<4} | " + ' '.join(f'{name} {value:.1f}us' for name, value in us.items()), file=sys.stderr)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+import argparse
+import json
+import sys
+import timeit
+
+import numpy as np
+
+from byte_tracker.kalman_filter import KalmanFilter
+
+# Micro-benchmark of KalmanFilter.multi_predict against the dense version it replaced, which built the motion
+# noise with one np.diag per track and propagated the covariance with two full 8x8 products:
+#   python -m benchmarks.kalman_predict --tracks 10 50 200
+
+
+def dense_multi_predict(kf, mean, covariance):
+    std_pos = [
+        kf._std_weight_position * mean[:, 3],
+        kf._std_weight_position * mean[:, 3],
+        1e-2 * np.ones_like(mean[:, 3]),
+        kf._std_weight_position * mean[:, 3],
+    ]
+    std_vel = [
+        kf._std_weight_velocity * mean[:, 3],
+        kf._std_weight_velocity * mean[:, 3],
+        1e-5 * np.ones_like(mean[:, 3]),
+        kf._std_weight_velocity * mean[:, 3],
+    ]
+    sqr = np.square(np.r_[std_pos, std_vel]).T
+
+    motion_cov = []
+    for i in range(len(mean)):
+        motion_cov.append(np.diag(sqr[i]))
+    motion_cov = np.asarray(motion_cov)
+
+    mean = np.dot(mean, kf._motion_mat.T)
+    left = np.dot(kf._motion_mat, covariance).transpose((1, 0, 2))
+    covariance = np.dot(left, kf._motion_mat.T) + motion_cov
+    return mean, covariance
+
+def tracks(kf, n, rng):
+    # n tracks a few frames into their life, so the covariances are dense
+    mean = np.empty((n, 8))
+    covariance = np.empty((n, 8, 8))
+    for i in range(n):
+        m, c = kf.initiate(np.array([rng.uniform(0, 1920), rng.uniform(0, 1080), rng.uniform(0.3, 3), rng.uniform(20, 300)]))
+        for _ in range(3):
+            m, c = kf.predict(m, c)
+            m, c = kf.update(m, c, m[:4] + rng.normal(0, 1, 4) * [2, 2, 0.01, 2])
+        mean[i], covariance[i] = m, c
+    return mean, covariance
+
+def main():
+    parser = argparse.ArgumentParser(description='Time KalmanFilter.multi_predict against the dense reference')
+    parser.add_argument('--tracks', type=int, nargs='+', default=[1, 10, 50, 200])
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    opt = parser.parse_args()
+
+    kf = KalmanFilter()
+    rng = np.random.default_rng(opt.seed)
+    results = []
+    for n in opt.tracks:
+        mean, covariance = tracks(kf, n, rng)
+        expected = dense_multi_predict(kf, mean, covariance)
+        predicted = kf.multi_predict(mean, covariance)
+        assert all(np.allclose(a, b, rtol=1e-12, atol=1e-12) for a, b in zip(expected, predicted)), 'multi_predict disagrees with the dense reference'
+
+        out = (np.empty_like(mean), np.empty_like(covariance))
+        timings = {
+            'dense': lambda: dense_multi_predict(kf, mean, covariance),
+            'closed_form': lambda: kf.multi_predict(mean, covariance),
+            'closed_form_out': lambda: kf.multi_predict(mean, covariance, out=out),
+        }
+        us = {name: min(timeit.repeat(fn, number=opt.iterations, repeat=3)) / opt.iterations * 1e6 for name, fn in timings.items()}
+        results.append({'tracks': n, 'us': us, 'speedup': us['dense'] / us['closed_form_out']})
+        print(f"{n:>5} tracks | " + ' '.join(f'{name} {value:.1f}us' for name, value in us.items()) +
+              f" | {results[-1]['speedup']:.1f}x", file=sys.stderr)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
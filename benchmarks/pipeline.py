@@ -0,0 +1,257 @@
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+import torch
+import yaml
+
+from byte_tracker import BYTETracker
+from models.experimental import attempt_load
+from utils import ocr
+from utils.datasets import Preprocessor
+from utils.detections import Detections, draw
+from utils.general import check_img_size, crop, detections_to_numpy, non_max_suppression_fast
+from utils.ocr_pool import read_texts
+from utils.torch_utils import select_device
+
+# Offline benchmark of the detect -> track -> OCR -> draw path, one stage at a time.
+# NMS and everything after it run on synthetic detector output: objects moving across the frame, each seen by a
+# cluster of overlapping candidates, so box counts are controlled and identical between runs and machines.
+# The model forward pass runs on the real frames when --weights is given.
+
+STAGES = ('letterbox', 'forward', 'nms', 'postprocess', 'track', 'ocr', 'draw')
+
+
+def parse_resolution(text):
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+def percentiles(samples):
+    ms = np.array(samples) * 1000
+    return {'mean': float(ms.mean()), 'p50': float(np.percentile(ms, 50)), 'p90': float(np.percentile(ms, 90)),
+            'p99': float(np.percentile(ms, 99)), 'max': float(ms.max())}
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024  # bytes on macOS, KiB on Linux
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {'commit': commit, 'python': platform.python_version(), 'torch': torch.__version__, 'numpy': np.__version__,
+            'opencv': cv2.__version__, 'machine': platform.machine(), 'processor': platform.processor(),
+            'threads': torch.get_num_threads()}
+
+def load_frames(source, resolution, count, rng):
+    if source is None:
+        return [rng.integers(0, 256, (resolution[1], resolution[0], 3), dtype=np.uint8) for _ in range(min(count, 8))]
+    cap = cv2.VideoCapture(source)
+    frames = []
+    while len(frames) < count:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(cv2.resize(frame, resolution))
+    cap.release()
+    assert len(frames) > 0, f'could not read frames from {source}'
+    return frames
+
+
+class SyntheticObjects:
+    # n objects bouncing around the image area of the letterboxed input, every one reported by `cluster` jittered candidates
+    def __init__(self, n, img_size, resolution, nc, rng, cluster=6):
+        self.img_size = img_size
+        self.nc = nc
+        self.cluster = cluster
+        self.rng = rng
+        content = np.array(resolution) * img_size / max(resolution)
+        self.bounds = (img_size - content) / 2, (img_size + content) / 2  # boxes never land in the padding
+        self.size = rng.uniform(0.04, 0.2, (n, 2)) * content
+        self.position = rng.uniform(self.bounds[0] + self.size / 2, self.bounds[1] - self.size / 2)
+        self.velocity = rng.uniform(-4, 4, (n, 2))
+        self.classes = np.arange(n) % nc
+        self.anchors = 3 * sum((img_size // s) ** 2 for s in (8, 16, 32))
+
+    def prediction(self):
+        # (1, anchors, 5 + nc) raw head output: low-confidence background plus the object clusters
+        self.position += self.velocity
+        low, high = self.bounds[0] + self.size / 2, self.bounds[1] - self.size / 2
+        self.velocity[(self.position < low) | (self.position > high)] *= -1
+        self.position = np.clip(self.position, low, high)
+
+        pred = np.zeros((self.anchors, 5 + self.nc), dtype=np.float32)
+        pred[:, :2] = self.rng.uniform(0, self.img_size, (self.anchors, 2))
+        pred[:, 2:4] = self.rng.uniform(4, self.img_size / 8, (self.anchors, 2))
+        pred[:, 4] = self.rng.uniform(0, 0.2, self.anchors)
+        pred[:, 5:] = self.rng.uniform(0, 1, (self.anchors, self.nc))
+
+        n = len(self.position) * self.cluster
+        rows = self.rng.choice(self.anchors, n, replace=False)
+        pred[rows, :2] = np.repeat(self.position, self.cluster, 0) + self.rng.normal(0, 2, (n, 2))
+        pred[rows, 2:4] = np.repeat(self.size, self.cluster, 0) * self.rng.uniform(0.9, 1.1, (n, 2))
+        pred[rows, 4] = self.rng.uniform(0.6, 0.99, n)
+        pred[rows, 5:] = 0.05
+        pred[rows, 5 + np.repeat(self.classes, self.cluster)] = 0.95
+        return torch.from_numpy(pred)[None]
+
+
+def run_scenario(opt, model, device, half, classes, recognizer, resolution, boxes, rng):
+    frames = load_frames(opt.source, resolution, opt.frames + opt.warmup, rng)
+    preprocessor = Preprocessor(opt.img_size, device, half=half)
+    objects = SyntheticObjects(boxes, opt.img_size, resolution, len(classes), rng)
+    ocr_classes = set(opt.ocr_classes)
+    recognize_only = set(opt.ocr_recognize_only_classes)
+    tracker = BYTETracker()
+    times = {stage: [] for stage in STAGES}
+    totals = []
+
+    for n in range(opt.frames + opt.warmup):
+        frame = frames[n % len(frames)]
+        pred = objects.prediction().to(device)
+        clock = [time.perf_counter()]
+
+        def lap():
+            now = time.perf_counter()
+            elapsed, clock[0] = now - clock[0], now
+            return elapsed
+
+        _, img = preprocessor([frame], auto=False)
+        spent = {'letterbox': lap()}
+
+        if model is not None:
+            with torch.no_grad():
+                model(img)
+            if device.type != 'cpu':
+                torch.cuda.synchronize(device)
+        spent['forward'] = lap()
+
+        det = non_max_suppression_fast(pred, opt.conf_thres, opt.iou_thres)[0]
+        spent['nms'] = lap()
+
+        raw_detection = detections_to_numpy(det, img.shape[2:], frame.shape)
+        spent['postprocess'] = lap()
+        raw_detection = tracker.update(raw_detection)
+        spent['track'] = lap()
+        detections = Detections(raw_detection, classes, tracking=True).to_dict()
+        spent['postprocess'] += lap()
+
+        if recognizer is not None:
+            readable = [d for d in detections if d['class'] in ocr_classes and d['width'] * d['height'] > 0]
+            for detect_text in (False, True):  # the same split as YOLOv7: recognize-only classes in one batch
+                crops = [crop(frame, d) for d in readable if (d['class'] not in recognize_only) == detect_text]
+                if crops:
+                    read_texts(recognizer, crops, detect_text)
+        spent['ocr'] = lap()
+
+        draw(frame, detections)
+        spent['draw'] = lap()
+
+        if n >= opt.warmup:
+            for stage in STAGES:
+                times[stage].append(spent[stage])
+            totals.append(sum(spent.values()))
+
+    skipped = {'forward': model is None, 'ocr': recognizer is None}
+    return {
+        'resolution': f'{resolution[0]}x{resolution[1]}',
+        'boxes': boxes,
+        'frames': len(totals),
+        'stages': {stage: None if skipped.get(stage) else percentiles(times[stage]) for stage in STAGES},
+        'total': percentiles(totals),
+        'fps': len(totals) / sum(totals),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+def compare(results, baseline, tolerance):
+    # Regressions: any stage p50 or total p50 slower than the baseline by more than tolerance, fps lower by as much
+    regressions = []
+    for key in ('weights', 'img_size', 'device', 'source', 'ocr_backend'):
+        if baseline['settings'].get(key) != results['settings'].get(key):
+            print(f"[!] baseline ran with {key}={baseline['settings'].get(key)}, this run with {results['settings'].get(key)}", file=sys.stderr)
+    previous = {(s['resolution'], s['boxes']): s for s in baseline['scenarios']}
+    for scenario in results['scenarios']:
+        old = previous.get((scenario['resolution'], scenario['boxes']))
+        if old is None:
+            continue
+        name = f"{scenario['resolution']} {scenario['boxes']} boxes"
+        for stage in STAGES + ('total',):
+            new_stats = scenario['total'] if stage == 'total' else scenario['stages'][stage]
+            old_stats = old['total'] if stage == 'total' else old['stages'].get(stage)
+            if new_stats and old_stats and new_stats['p50'] > old_stats['p50'] * (1 + tolerance):
+                regressions.append(f"{name}: {stage} p50 {old_stats['p50']:.2f}ms -> {new_stats['p50']:.2f}ms")
+        if scenario['fps'] < old['fps'] * (1 - tolerance):
+            regressions.append(f"{name}: {old['fps']:.1f} -> {scenario['fps']:.1f} fps")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-stage latency benchmark of the detect -> track -> OCR -> draw pipeline')
+    parser.add_argument('--weights', default=None, help='model weights, the forward stage is skipped without them')
+    parser.add_argument('--classes', default='classes.yaml')
+    parser.add_argument('--source', default=None, help='recorded video, synthetic noise frames when omitted')
+    parser.add_argument('--resolutions', nargs='+', default=['640x480', '1280x720', '1920x1080'])
+    parser.add_argument('--boxes', type=int, nargs='+', default=[5, 20, 100])
+    parser.add_argument('--img-size', type=int, default=640)
+    parser.add_argument('--device', default='cpu')
+    parser.add_argument('--conf-thres', type=float, default=0.25)
+    parser.add_argument('--iou-thres', type=float, default=0.45)
+    parser.add_argument('--frames', type=int, default=100)
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--ocr-backend', default=None, help='OCR backend to time (e.g. paddle), the ocr stage is skipped without it')
+    parser.add_argument('--ocr-classes', nargs='+', default=['tablica'])
+    parser.add_argument('--ocr-recognize-only-classes', nargs='*', default=['tablica'], help='classes read without text detection')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help='write the JSON results to this file instead of stdout')
+    parser.add_argument('--compare', default=None, help='baseline JSON from a previous run, exits with 1 on regressions')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='allowed relative slowdown against --compare')
+    opt = parser.parse_args()
+
+    device = select_device(opt.device)
+    half = device.type != 'cpu'
+    model = None
+    if opt.weights is not None:
+        model = attempt_load(opt.weights, device=device)
+        model = model.half() if half else model
+        opt.img_size = check_img_size(opt.img_size, s=int(model.stride.max()))
+    classes = yaml.load(open(opt.classes), Loader=yaml.SafeLoader)['classes']
+
+    recognizer = None
+    if opt.ocr_backend is not None:
+        recognizer = ocr.create_backend(opt.ocr_backend)
+        recognizer.warmup()
+
+    results = {'environment': environment(), 'settings': vars(opt), 'scenarios': []}
+    for resolution in map(parse_resolution, opt.resolutions):
+        for boxes in opt.boxes:
+            rng = np.random.default_rng(opt.seed)
+            scenario = run_scenario(opt, model, device, half, classes, recognizer, resolution, boxes, rng)
+            results['scenarios'].append(scenario)
+            stages = ' '.join(f"{stage} {stats['p50']:.2f}" for stage, stats in scenario['stages'].items() if stats is not None)
+            print(f"{scenario['resolution']:>9} {boxes:>4} boxes | p50 ms: {stages} | {scenario['fps']:.1f} fps", file=sys.stderr)
+
+    if opt.output:
+        Path(opt.output).write_text(json.dumps(results, indent=2))
+    else:
+        print(json.dumps(results, indent=2))
+
+    if opt.compare:
+        regressions = compare(results, json.loads(Path(opt.compare).read_text()), opt.tolerance)
+        for regression in regressions:
+            print(f'[!] {regression}', file=sys.stderr)
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,118 +1,27 @@
+import time
+from collections import deque
+
 import numpy as np
 from byte_tracker import matching
 from byte_tracker.base_track import BaseTrack, TrackState
 from byte_tracker.kalman_filter import KalmanFilter
+from byte_tracker.track_store import TrackStore
 from utils.general import xywh2xyxy, xyxy2xywh
-
-
-class STrack(BaseTrack):
-    shared_kalman = KalmanFilter()
-
-    def __init__(self, tlwh, score, cls):
-        self._tlwh = np.asarray(tlwh, dtype=np.float)
-        self.kalman_filter = None
-        self.mean, self.covariance = None, None
-        self.is_activated = False
-        self.score = score
-        self.tracklet_len = 0
-        self.cls = cls
-
-    def predict(self):
-        mean_state = self.mean.copy()
-        if self.state != TrackState.Tracked:
-            mean_state[7] = 0
-        self.mean, self.covariance = self.kalman_filter.predict(mean_state, self.covariance)
-
-    @staticmethod
-    def multi_predict(stracks):
-        if len(stracks) > 0:
-            multi_mean = np.asarray([st.mean.copy() for st in stracks])
-            multi_covariance = np.asarray([st.covariance for st in stracks])
-            for i, st in enumerate(stracks):
-                if st.state != TrackState.Tracked:
-                    multi_mean[i][7] = 0
-            multi_mean, multi_covariance = STrack.shared_kalman.multi_predict(multi_mean, multi_covariance)
-            for i, (mean, cov) in enumerate(zip(multi_mean, multi_covariance)):
-                stracks[i].mean = mean
-                stracks[i].covariance = cov
-
-    def activate(self, kalman_filter, frame_id):
-        self.kalman_filter = kalman_filter
-        self.track_id = self.next_id()
-        self.mean, self.covariance = self.kalman_filter.initiate(self.tlwh_to_xyah(self._tlwh))
-        self.tracklet_len = 0
-        self.state = TrackState.Tracked
-        if frame_id == 1:
-            self.is_activated = True
-        self.frame_id = frame_id
-        self.start_frame = frame_id
-
-    def re_activate(self, new_track, frame_id, new_id=False):
-        self.mean, self.covariance = self.kalman_filter.update(self.mean, self.covariance, self.tlwh_to_xyah(new_track.tlwh))
-        self.tracklet_len = 0
-        self.state = TrackState.Tracked
-        self.is_activated = True
-        self.frame_id = frame_id
-        if new_id:
-            self.track_id = self.next_id()
-        self.score = new_track.score
-        self.cls = new_track.cls
-
-    def update(self, new_track, frame_id):
-        self.frame_id = frame_id
-        self.tracklet_len += 1
-        new_tlwh = new_track.tlwh
-        self.mean, self.covariance = self.kalman_filter.update(self.mean, self.covariance, self.tlwh_to_xyah(new_tlwh))
-        self.state = TrackState.Tracked
-        self.is_activated = True
-        self.score = new_track.score
-
-    @property
-    def tlwh(self):
-        if self.mean is None:
-            return self._tlwh.copy()
-        ret = self.mean[:4].copy()
-        ret[2] *= ret[3]
-        ret[:2] -= ret[2:] / 2
-        return ret
-
-    @property
-    def tlbr(self):
-        ret = self.tlwh.copy()
-        ret[2:] += ret[:2]
-        return ret
-
-    @staticmethod
-    def tlwh_to_xyah(tlwh):
-        ret = np.asarray(tlwh).copy()
-        ret[:2] += ret[2:] / 2
-        ret[2] /= ret[3]
-        return ret
-
-    def to_xyah(self):
-        return self.tlwh_to_xyah(self.tlwh)
-
-    @staticmethod
-    def tlbr_to_tlwh(tlbr):
-        ret = np.asarray(tlbr).copy()
-        ret[2:] -= ret[:2]
-        return ret
-
-    @staticmethod
-    def tlwh_to_tlbr(tlwh):
-        ret = np.asarray(tlwh).copy()
-        ret[2:] += ret[:2]
-        return ret
-
-    def __repr__(self):
-        return "OT_{}_({}-{})".format(self.track_id, self.start_frame, self.end_frame)
+from utils.profiling import Profiler
 
 
 class BYTETracker(object):
-    def __init__(self, track_thresh=0.45, track_buffer=25, match_thresh=0.8, frame_rate=30):
-        self.tracked_stracks = []
-        self.lost_stracks = []
-        self.removed_stracks = []
+    # Tracks live in a TrackStore; tracked_slots/lost_slots are ordered slot index arrays standing in for
+    # ByteTrack's track lists, so predict, association and update work on whole arrays.
+    # Removed tracks free their slot at once: only the ids of the last `removed_history` are kept, and finished
+    # tracks are written to `archive` (a TrackArchive, tagged with `name`) when one is given
+    def __init__(self, track_thresh=0.45, track_buffer=25, match_thresh=0.8, frame_rate=30, profiler=None, removed_history=1000, archive=None, name=None):
+        self.store = TrackStore()
+        self.tracked_slots = np.empty(0, dtype=int)
+        self.lost_slots = np.empty(0, dtype=int)
+        self.removed_track_ids = deque(maxlen=removed_history)
+        self.archive = archive
+        self.name = name
         self.frame_id = 0
         self.track_buffer = track_buffer
         self.track_thresh = track_thresh
@@ -121,178 +30,196 @@ class BYTETracker(object):
         self.buffer_size = int(frame_rate / 30.0 * track_buffer)
         self.max_time_lost = self.buffer_size
         self.kalman_filter = KalmanFilter()
+        self.removed_ids = []
+        self.profiler = profiler if profiler is not None else Profiler()
 
     def update(self, dets):
         self.frame_id += 1
-        activated_starcks = []
-        refind_stracks = []
-        lost_stracks = []
-        removed_stracks = []
+        store = self.store
 
         xyxys = dets[:, 0:4]
         xywh = xyxy2xywh(xyxys)
         confs = dets[:, 4]
         clss = dets[:, 5]
 
-        classes = clss
-        xyxys = xyxys
-        confs = confs
-
         remain_inds = confs > self.track_thresh
         inds_low = confs > 0.1
         inds_high = confs < self.track_thresh
 
         inds_second = np.logical_and(inds_low, inds_high)
 
-        dets_second = xywh[inds_second]
+        # detections use ByteTrack's tlwh layout filled with centre xywh; tracks carry the same offset, so IoUs are unaffected
         dets = xywh[remain_inds]
+        dets_second = xywh[inds_second]
 
         scores_keep = confs[remain_inds]
         scores_second = confs[inds_second]
 
-        clss_keep = classes[remain_inds]
-        clss_second = classes[remain_inds]
-
-        if len(dets) > 0:
-            detections = [STrack(xyxy, s, c) for (xyxy, s, c) in zip(dets, scores_keep, clss_keep)]
-        else:
-            detections = []
-
-        unconfirmed = []
-        tracked_stracks = []
-        for track in self.tracked_stracks:
-            if not track.is_activated:
-                unconfirmed.append(track)
-            else:
-                tracked_stracks.append(track)
-
-        strack_pool = joint_stracks(tracked_stracks, self.lost_stracks)
-        STrack.multi_predict(strack_pool)
-        dists = matching.iou_distance(strack_pool, detections)
-        dists = matching.fuse_score(dists, detections)
-        matches, u_track, u_detection = matching.linear_assignment(dists, thresh=self.match_thresh)
-
-        for itracked, idet in matches:
-            track = strack_pool[itracked]
-            det = detections[idet]
-            if track.state == TrackState.Tracked:
-                track.update(detections[idet], self.frame_id)
-                activated_starcks.append(track)
-            else:
-                track.re_activate(det, self.frame_id, new_id=False)
-                refind_stracks.append(track)
-
-        if len(dets_second) > 0:
-            detections_second = [STrack(xywh, s, c) for (xywh, s, c) in zip(dets_second, scores_second, clss_second)]
-        else:
-            detections_second = []
-        
-        r_tracked_stracks = [strack_pool[i] for i in u_track if strack_pool[i].state == TrackState.Tracked]
-        dists = matching.iou_distance(r_tracked_stracks, detections_second)
-        matches, u_track, u_detection_second = matching.linear_assignment(dists, thresh=0.5)
-        for itracked, idet in matches:
-            track = r_tracked_stracks[itracked]
-            det = detections_second[idet]
-            if track.state == TrackState.Tracked:
-                track.update(det, self.frame_id)
-                activated_starcks.append(track)
-            else:
-                track.re_activate(det, self.frame_id, new_id=False)
-                refind_stracks.append(track)
-
-        for it in u_track:
-            track = r_tracked_stracks[it]
-            if not track.state == TrackState.Lost:
-                track.mark_lost()
-                lost_stracks.append(track)
-
-        detections = [detections[i] for i in u_detection]
-        dists = matching.iou_distance(unconfirmed, detections)
-        dists = matching.fuse_score(dists, detections)
-        matches, u_unconfirmed, u_detection = matching.linear_assignment(dists, thresh=0.7)
-
-        for itracked, idet in matches:
-            unconfirmed[itracked].update(detections[idet], self.frame_id)
-            activated_starcks.append(unconfirmed[itracked])
-        
-        for it in u_unconfirmed:
-            track = unconfirmed[it]
-            track.mark_removed()
-            removed_stracks.append(track)
-
-        for inew in u_detection:
-            track = detections[inew]
-            if track.score < self.det_thresh:
-                continue
-            track.activate(self.kalman_filter, self.frame_id)
-            activated_starcks.append(track)
-        
-        for track in self.lost_stracks:
-            if self.frame_id - track.end_frame > self.max_time_lost:
-                track.mark_removed()
-                removed_stracks.append(track)
-
-        self.tracked_stracks = [t for t in self.tracked_stracks if t.state == TrackState.Tracked]
-        self.tracked_stracks = joint_stracks(self.tracked_stracks, activated_starcks)
-        self.tracked_stracks = joint_stracks(self.tracked_stracks, refind_stracks)
-        self.lost_stracks = sub_stracks(self.lost_stracks, self.tracked_stracks)
-        self.lost_stracks.extend(lost_stracks)
-        self.lost_stracks = sub_stracks(self.lost_stracks, self.removed_stracks)
-        self.removed_stracks.extend(removed_stracks)
-        self.tracked_stracks, self.lost_stracks = remove_duplicate_stracks(self.tracked_stracks, self.lost_stracks)
-        output_stracks = [track for track in self.tracked_stracks if track.is_activated]
-        outputs = []
-
-        for t in output_stracks:
-            output = []
-            tlwh = t.tlwh
-            tid = t.track_id
-            tlwh = np.expand_dims(tlwh, axis=0)
-            xyxy = xywh2xyxy(tlwh)
-            xyxy = np.squeeze(xyxy, axis=0)
-            output.extend(xyxy)
-            output.append(tid)
-            output.append(t.cls)
-            output.append(t.score)
-            outputs.append(output)
-
-        outputs = np.array(outputs)
-        return outputs
-
-def joint_stracks(tlista, tlistb):
-    exists = {}
-    res = []
-    for t in tlista:
-        exists[t.track_id] = 1
-        res.append(t)
-    for t in tlistb:
-        tid = t.track_id
-        if not exists.get(tid, 0):
-            exists[tid] = 1
-            res.append(t)
-    return res
-
-def sub_stracks(tlista, tlistb):
-    stracks = {}
-    for t in tlista:
-        stracks[t.track_id] = t
-    for t in tlistb:
-        tid = t.track_id
-        if stracks.get(tid, 0):
-            del stracks[tid]
-    return list(stracks.values())
-
-def remove_duplicate_stracks(stracksa, stracksb):
-    pdist = matching.iou_distance(stracksa, stracksb)
-    pairs = np.where(pdist < 0.15)
-    dupa, dupb = list(), list()
-    for p, q in zip(*pairs):
-        timep = stracksa[p].frame_id - stracksa[p].start_frame
-        timeq = stracksb[q].frame_id - stracksb[q].start_frame
-        if timep > timeq:
-            dupb.append(q)
-        else:
-            dupa.append(p)
-    resa = [t for i, t in enumerate(stracksa) if not i in dupa]
-    resb = [t for i, t in enumerate(stracksb) if not i in dupb]
-    return resa, resb
\ No newline at end of file
+        clss_keep = clss[remain_inds]
+        clss_second = clss[inds_second]
+
+        activated = self.store.is_activated[self.tracked_slots]
+        unconfirmed = self.tracked_slots[~activated]
+        strack_pool = joint_slots(self.tracked_slots[activated], self.lost_slots)
+
+        with self.profiler.stage('track.predict'):
+            self.__predict(strack_pool)
+        with self.profiler.stage('track.associate'):
+            dists = matching.iou_distance(store.tlbr(strack_pool), tlwh_to_tlbr(dets))
+            dists = matching.fuse_score(dists, scores_keep)
+            matches, u_track, u_detection = assign(dists, self.match_thresh)
+
+        activated_first, refind_stracks = self.__apply(strack_pool[matches[:, 0]], dets[matches[:, 1]], scores_keep[matches[:, 1]], clss_keep[matches[:, 1]])
+
+        r_tracked_stracks = strack_pool[u_track]
+        r_tracked_stracks = r_tracked_stracks[store.state[r_tracked_stracks] == TrackState.Tracked]
+        with self.profiler.stage('track.associate_second'):
+            dists = matching.iou_distance(store.tlbr(r_tracked_stracks), tlwh_to_tlbr(dets_second))
+            matches, u_track, _ = assign(dists, 0.5)
+
+        activated_second, refind_second = self.__apply(r_tracked_stracks[matches[:, 0]], dets_second[matches[:, 1]], scores_second[matches[:, 1]], clss_second[matches[:, 1]])
+
+        lost_stracks = r_tracked_stracks[u_track]
+        lost_stracks = lost_stracks[store.state[lost_stracks] != TrackState.Lost]
+        store.state[lost_stracks] = TrackState.Lost
+
+        left = u_detection
+        with self.profiler.stage('track.associate_unconfirmed'):
+            dists = matching.iou_distance(store.tlbr(unconfirmed), tlwh_to_tlbr(dets[left]))
+            dists = matching.fuse_score(dists, scores_keep[left])
+            matches, u_unconfirmed, u_detection = assign(dists, 0.7)
+
+        activated_unconfirmed, _ = self.__apply(unconfirmed[matches[:, 0]], dets[left][matches[:, 1]], scores_keep[left][matches[:, 1]], clss_keep[left][matches[:, 1]])
+
+        removed_stracks = unconfirmed[u_unconfirmed]
+        store.state[removed_stracks] = TrackState.Removed
+
+        new = left[u_detection]
+        new = new[scores_keep[new] >= self.det_thresh]
+        activated_new = self.__activate(dets[new], scores_keep[new], clss_keep[new])
+
+        timed_out = self.lost_slots[self.frame_id - store.frame_id[self.lost_slots] > self.max_time_lost]
+        store.state[timed_out] = TrackState.Removed
+        removed_stracks = np.concatenate((removed_stracks, timed_out))
+
+        tracked_slots = self.tracked_slots[store.state[self.tracked_slots] == TrackState.Tracked]
+        tracked_slots = joint_slots(tracked_slots, np.concatenate((activated_first, activated_second, activated_unconfirmed, activated_new)))
+        tracked_slots = joint_slots(tracked_slots, np.concatenate((refind_stracks, refind_second)))
+        lost_slots = sub_slots(self.lost_slots, tracked_slots)
+        lost_slots = np.concatenate((lost_slots, lost_stracks))
+        lost_slots = lost_slots[~store.was_removed[lost_slots]]  # ids already in the removed history
+        self.tracked_slots, self.lost_slots, duplicates = remove_duplicate_slots(store, tracked_slots, lost_slots)
+        duplicates = duplicates[store.state[duplicates] != TrackState.Removed]  # a timed out lost track may also be a duplicate
+        store.state[duplicates] = TrackState.Removed
+        removed_stracks = np.concatenate((removed_stracks, duplicates))
+
+        self.removed_ids = store.track_id[removed_stracks].tolist()
+        finished = removed_stracks[~store.was_removed[removed_stracks]]  # timed out lost tracks are removed twice
+        self.removed_track_ids.extend(store.track_id[finished].tolist())
+        if self.archive is not None:
+            self.archive.write(self.__records(finished[store.is_activated[finished]]))
+        store.was_removed[removed_stracks] = True
+
+        alive = np.zeros(store.capacity, dtype=bool)
+        alive[self.tracked_slots] = True
+        alive[self.lost_slots] = True
+        store.release(np.flatnonzero(store.used & ~alive))
+        return self.__outputs(self.tracked_slots)
+
+    def predict(self):
+        # Advances the tracks by one frame without detections, for frames the detector skips
+        self.frame_id += 1
+        self.removed_ids = []
+        activated = self.store.is_activated[self.tracked_slots]
+        self.__predict(joint_slots(self.tracked_slots[activated], self.lost_slots))
+        return self.__outputs(self.tracked_slots)
+
+    def __predict(self, slots):
+        if len(slots) == 0:
+            return
+        store = self.store
+        mean, covariance = store.mean[slots], store.covariance[slots]
+        mean[store.state[slots] != TrackState.Tracked, 7] = 0
+        self.kalman_filter.multi_predict(mean, covariance, out=(mean, covariance))
+        store.mean[slots], store.covariance[slots] = mean, covariance
+
+    def __apply(self, slots, tlwh, scores, clss):
+        # Matched tracks take their detection; lost ones are re-activated and also take its class.
+        # Returns (updated, re-activated) slots
+        store = self.store
+        tracked = store.state[slots] == TrackState.Tracked
+        if len(slots) > 0:
+            store.mean[slots], store.covariance[slots] = self.kalman_filter.multi_update(store.mean[slots], store.covariance[slots], tlwh_to_xyah(tlwh))
+        store.tracklet_len[slots] = np.where(tracked, store.tracklet_len[slots] + 1, 0)
+        store.cls[slots[~tracked]] = clss[~tracked]
+        store.score[slots] = scores
+        store.state[slots] = TrackState.Tracked
+        store.is_activated[slots] = True
+        store.frame_id[slots] = self.frame_id
+        return slots[tracked], slots[~tracked]
+
+    def __activate(self, tlwh, scores, clss):
+        store = self.store
+        slots = store.allocate(len(tlwh))
+        for slot, measurement in zip(slots, tlwh_to_xyah(tlwh)):
+            store.track_id[slot] = BaseTrack.next_id()
+            store.mean[slot], store.covariance[slot] = self.kalman_filter.initiate(measurement)
+        store.score[slots] = scores
+        store.cls[slots] = clss
+        store.tracklet_len[slots] = 0
+        store.state[slots] = TrackState.Tracked
+        store.is_activated[slots] = self.frame_id == 1
+        store.frame_id[slots] = self.frame_id
+        store.start_frame[slots] = self.frame_id
+        return slots
+
+    def __records(self, slots):
+        # Archive entries of finished tracks, box is the last Kalman estimate in [x1, y1, x2, y2]
+        store = self.store
+        xyxy = xywh2xyxy(store.tlwh(slots))
+        removed_at = time.time()
+        return [{'stream': self.name, 'id': int(store.track_id[slot]), 'class': int(store.cls[slot]), 'score': float(store.score[slot]),
+                 'start_frame': int(store.start_frame[slot]), 'end_frame': int(store.frame_id[slot]), 'tracklet_len': int(store.tracklet_len[slot]),
+                 'box': box.tolist(), 'removed_at': removed_at} for slot, box in zip(slots, xyxy)]
+
+    def __outputs(self, slots):
+        # (n, 7) rows [x1, y1, x2, y2, track id, class, score] of the activated tracks
+        store = self.store
+        slots = slots[store.is_activated[slots]]
+        xyxy = xywh2xyxy(store.tlwh(slots))
+        return np.column_stack((xyxy, store.track_id[slots], store.cls[slots], store.score[slots]))
+
+def assign(cost_matrix, thresh):
+    # linear_assignment() with index arrays that can be used directly for fancy indexing
+    matches, unmatched_a, unmatched_b = matching.linear_assignment(cost_matrix, thresh)
+    return np.asarray(matches, dtype=int).reshape(-1, 2), np.asarray(unmatched_a, dtype=int), np.asarray(unmatched_b, dtype=int)
+
+def tlwh_to_xyah(tlwh):
+    ret = tlwh.copy()
+    ret[:, :2] += ret[:, 2:] / 2
+    ret[:, 2] /= ret[:, 3]
+    return ret
+
+def tlwh_to_tlbr(tlwh):
+    ret = tlwh.copy()
+    ret[:, 2:] += ret[:, :2]
+    return ret
+
+def joint_slots(a, b):
+    return np.concatenate((a, b[~np.isin(b, a)]))
+
+def sub_slots(a, b):
+    return a[~np.isin(a, b)]
+
+def remove_duplicate_slots(store, a, b):
+    # Of a tracked and a lost track covering the same object, the younger one is dropped.
+    # Returns the kept tracked and lost slots and the dropped ones
+    pdist = matching.iou_distance(store.tlbr(a), store.tlbr(b))
+    p, q = np.where(pdist < 0.15)
+    timep = store.frame_id[a[p]] - store.start_frame[a[p]]
+    timeq = store.frame_id[b[q]] - store.start_frame[b[q]]
+    keep_a = np.ones(len(a), dtype=bool)
+    keep_b = np.ones(len(b), dtype=bool)
+    keep_a[p[timep <= timeq]] = False
+    keep_b[q[timep > timeq]] = False
+    return a[keep_a], b[keep_b], np.concatenate((a[~keep_a], b[~keep_b]))
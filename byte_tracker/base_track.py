@@ -1,4 +1,5 @@
 from collections import OrderedDict
+import threading
 import numpy as np
 
 
@@ -11,6 +12,7 @@ class TrackState(object):
 
 class BaseTrack(object):
     _count = 0
+    _count_lock = threading.Lock()  # ids are shared by the trackers of every stream and worker thread
     track_id = 0
     is_activated = False
     state = TrackState.New
@@ -29,8 +31,9 @@ class BaseTrack(object):
 
     @staticmethod
     def next_id():
-        BaseTrack._count += 1
-        return BaseTrack._count
+        with BaseTrack._count_lock:
+            BaseTrack._count += 1
+            return BaseTrack._count
 
     def activate(self, *args):
         raise NotImplementedError
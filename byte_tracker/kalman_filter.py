@@ -63,31 +63,62 @@ class KalmanFilter(object):
         covariance = np.linalg.multi_dot((self._update_mat, covariance, self._update_mat.T))
         return mean, covariance + innovation_cov
 
-    def multi_predict(self, mean, covariance):
-        std_pos = [
+    def multi_predict(self, mean, covariance, out=None):
+        # predict() for n tracks at once: mean (n, 8), covariance (n, 8, 8). The motion matrix is [[I, I], [0, I]],
+        # so with covariance [[A, B], [C, D]] the propagation is [[A + C + B + D, B + D], [C + D, D]], added up in
+        # place block by block. out=(mean, covariance) writes the result there, it may be the input arrays themselves
+        height = mean[:, 3]
+        sqr = np.empty_like(mean)
+        np.multiply(height, self._std_weight_position, out=sqr[:, 0])
+        sqr[:, 1] = sqr[:, 0]
+        sqr[:, 2] = 1e-2
+        sqr[:, 3] = sqr[:, 0]
+        np.multiply(height, self._std_weight_velocity, out=sqr[:, 4])
+        sqr[:, 5] = sqr[:, 4]
+        sqr[:, 6] = 1e-5
+        sqr[:, 7] = sqr[:, 4]
+        np.square(sqr, out=sqr)
+
+        new_mean, new_covariance = out if out is not None else (np.empty_like(mean), np.empty_like(covariance))
+        np.add(mean[:, :4], mean[:, 4:], out=new_mean[:, :4])
+        new_mean[:, 4:] = mean[:, 4:]
+
+        a, b = new_covariance[:, :4, :4], new_covariance[:, :4, 4:]
+        c, d = new_covariance[:, 4:, :4], new_covariance[:, 4:, 4:]
+        if new_covariance is not covariance:
+            new_covariance[...] = covariance
+        b += d
+        a += c
+        a += b
+        c += d
+        np.einsum('nii->ni', new_covariance)[...] += sqr  # motion noise on the diagonal
+        return new_mean, new_covariance
+
+    def multi_project(self, mean, covariance):
+        std = [
             self._std_weight_position * mean[:, 3],
             self._std_weight_position * mean[:, 3],
-            1e-2 * np.ones_like(mean[:, 3]),
+            1e-1 * np.ones_like(mean[:, 3]),
             self._std_weight_position * mean[:, 3],
         ]
-        std_vel = [
-            self._std_weight_velocity * mean[:, 3],
-            self._std_weight_velocity * mean[:, 3],
-            1e-5 * np.ones_like(mean[:, 3]),
-            self._std_weight_velocity * mean[:, 3],
-        ]
-        sqr = np.square(np.r_[std_pos, std_vel]).T
+        innovation_cov = np.square(np.r_[std]).T
 
-        motion_cov = []
-        for i in range(len(mean)):
-            motion_cov.append(np.diag(sqr[i]))
-        motion_cov = np.asarray(motion_cov)
+        # the update matrix selects the position part, so projecting is slicing
+        projected_cov = covariance[:, :4, :4].copy()
+        projected_cov[:, range(4), range(4)] += innovation_cov
+        return mean[:, :4], projected_cov
 
-        mean = np.dot(mean, self._motion_mat.T)
-        left = np.dot(self._motion_mat, covariance).transpose((1, 0, 2))
-        covariance = np.dot(left, self._motion_mat.T) + motion_cov
+    def multi_update(self, mean, covariance, measurement):
+        # update() for n tracks at once: mean (n, 8), covariance (n, 8, 8), measurement (n, 4)
+        projected_mean, projected_cov = self.multi_project(mean, covariance)
 
-        return mean, covariance
+        # the projected covariances are symmetric, so solving for the transposed gain needs no transposes of them
+        kalman_gain = np.linalg.solve(projected_cov, covariance[:, :4, :]).transpose((0, 2, 1))
+        innovation = measurement - projected_mean
+
+        new_mean = mean + np.matmul(kalman_gain, innovation[:, :, None])[:, :, 0]
+        new_covariance = covariance - np.matmul(np.matmul(kalman_gain, projected_cov), kalman_gain.transpose((0, 2, 1)))
+        return new_mean, new_covariance
 
     def update(self, mean, covariance, measurement):
         projected_mean, projected_cov = self.project(mean, covariance)
@@ -1,10 +1,14 @@
 import lap
 import numpy as np
 import scipy
-from cython_bbox import bbox_overlaps as bbox_ious
 from byte_tracker import kalman_filter
 from scipy.spatial.distance import cdist
 
+try:
+    from cython_bbox import bbox_overlaps  # optional compiled kernel, faster than NumPy on tracker-sized inputs
+except ImportError:
+    bbox_overlaps = None
+
 
 def merge_matches(m1, m2, shape):
     O, P, Q = shape
@@ -47,14 +51,40 @@ def linear_assignment(cost_matrix, thresh):
     matches = np.asarray(matches)
     return matches, unmatched_a, unmatched_b
 
-def ious(atlbrs, btlbrs):
-    ious = np.zeros((len(atlbrs), len(btlbrs)), dtype=np.float)
-    
-    if ious.size == 0:
-        return ious
+def as_boxes(tlbrs):
+    # (n, 4) float64 boxes; arrays that already are, such as the track store's, are used as they are
+    if isinstance(tlbrs, np.ndarray) and tlbrs.dtype == np.float64 and tlbrs.ndim == 2:
+        return tlbrs
+    return np.asarray(tlbrs, dtype=float).reshape(-1, 4)
 
-    ious = bbox_ious(np.ascontiguousarray(atlbrs, dtype=np.float), np.ascontiguousarray(btlbrs, dtype=np.float))
-    return ious
+def ious(atlbrs, btlbrs):
+    # IoU matrix of [x1, y1, x2, y2] boxes with the bbox_overlaps convention of cython_bbox: corners are inclusive
+    # pixels, so widths and heights get +1. cython_bbox is used when it is installed, numpy_ious otherwise; both
+    # give the same values (python -m benchmarks.iou compares their speed)
+    atlbrs = as_boxes(atlbrs)
+    btlbrs = as_boxes(btlbrs)
+    if len(atlbrs) == 0 or len(btlbrs) == 0:
+        return np.zeros((len(atlbrs), len(btlbrs)), dtype=float)
+    if bbox_overlaps is not None:
+        return bbox_overlaps(atlbrs, btlbrs)
+    return numpy_ious(atlbrs, btlbrs)
+
+def numpy_ious(atlbrs, btlbrs):
+    # Broadcast kernel over non-empty (n, 4) and (m, 4) float64 boxes
+    ax1, ay1, ax2, ay2 = atlbrs[:, 0, None], atlbrs[:, 1, None], atlbrs[:, 2, None], atlbrs[:, 3, None]
+    bx1, by1, bx2, by2 = btlbrs[:, 0], btlbrs[:, 1], btlbrs[:, 2], btlbrs[:, 3]
+    inter = np.minimum(ax2, bx2)
+    inter -= np.maximum(ax1, bx1)
+    inter += 1
+    np.maximum(inter, 0, out=inter)
+    ih = np.minimum(ay2, by2)
+    ih -= np.maximum(ay1, by1)
+    ih += 1
+    np.maximum(ih, 0, out=ih)
+    inter *= ih
+    union = (ax2 - ax1 + 1) * (ay2 - ay1 + 1) + (bx2 - bx1 + 1) * (by2 - by1 + 1)
+    union -= inter
+    return np.divide(inter, union, out=inter, where=inter > 0)  # disjoint pairs stay 0, also for degenerate boxes
 
 def iou_distance(atracks, btracks):
     if (len(atracks) > 0 and isinstance(atracks[0], np.ndarray)) or (len(btracks) > 0 and isinstance(btracks[0], np.ndarray)):
@@ -80,13 +110,13 @@ def v_iou_distance(atracks, btracks):
     return cost_matrix
 
 def embedding_distance(tracks, detections, metric="cosine"):
-    cost_matrix = np.zeros((len(tracks), len(detections)), dtype=np.float)
+    cost_matrix = np.zeros((len(tracks), len(detections)), dtype=float)
     
     if cost_matrix.size == 0:
         return cost_matrix
     
-    det_features = np.asarray([track.curr_feat for track in detections], dtype=np.float)
-    track_features = np.asarray([track.smooth_feat for track in tracks], dtype=np.float)
+    det_features = np.asarray([track.curr_feat for track in detections], dtype=float)
+    track_features = np.asarray([track.smooth_feat for track in tracks], dtype=float)
     cost_matrix = np.maximum(0.0, cdist(track_features, det_features, metric))
     return cost_matrix
 
@@ -128,10 +158,11 @@ def fuse_iou(cost_matrix, tracks, detections):
     return fuse_cost
 
 def fuse_score(cost_matrix, detections):
+    # detections may also be given directly as an array of their scores
     if cost_matrix.size == 0:
         return cost_matrix
     iou_sim = 1 - cost_matrix
-    det_scores = np.array([det.score for det in detections])
+    det_scores = detections if isinstance(detections, np.ndarray) else np.array([det.score for det in detections])
     det_scores = np.expand_dims(det_scores, axis=0).repeat(cost_matrix.shape[0], axis=0)
     fuse_sim = iou_sim * det_scores
     fuse_cost = 1 - fuse_sim
@@ -0,0 +1,29 @@
+import json
+import threading
+from pathlib import Path
+
+
+class TrackArchive:
+    # Append-only JSON Lines log of finished tracks for auditing, one object per track.
+    # Shared by the trackers of every stream, records carry the stream they came from
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.file = open(self.path, 'a')
+
+    def write(self, records):
+        if len(records) == 0:
+            return
+        with self.lock:
+            if self.file is None:
+                return
+            for record in records:
+                self.file.write(json.dumps(record, default=str) + '\n')
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
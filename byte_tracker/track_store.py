@@ -0,0 +1,58 @@
+import numpy as np
+
+
+class TrackStore:
+    # Structure-of-arrays state of every live track, addressed by slot index.
+    # Slots of dropped tracks are reused, the arrays double in size when every slot is taken
+    fields = {
+        'mean': ((8,), float),
+        'covariance': ((8, 8), float),
+        'score': ((), float),
+        'cls': ((), float),
+        'track_id': ((), np.int64),
+        'state': ((), np.int64),
+        'is_activated': ((), bool),
+        'was_removed': ((), bool),  # the track id is in the tracker's removed history
+        'frame_id': ((), np.int64),
+        'start_frame': ((), np.int64),
+        'tracklet_len': ((), np.int64),
+        'used': ((), bool),
+    }
+
+    def __init__(self, capacity=64):
+        self.capacity = 0
+        for name, (shape, dtype) in self.fields.items():
+            setattr(self, name, np.zeros((0,) + shape, dtype=dtype))
+        self.__grow(capacity)
+
+    def __grow(self, capacity):
+        for name in self.fields:
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.capacity] = old
+            setattr(self, name, new)
+        self.capacity = capacity
+
+    def allocate(self, n):
+        free = np.flatnonzero(~self.used)
+        if len(free) < n:
+            self.__grow(max(2 * self.capacity, self.capacity + n - len(free)))
+            free = np.flatnonzero(~self.used)
+        slots = free[:n]
+        self.used[slots] = True
+        self.was_removed[slots] = False
+        return slots
+
+    def release(self, slots):
+        self.used[slots] = False
+
+    def tlwh(self, slots):
+        ret = self.mean[slots, :4]
+        ret[:, 2] *= ret[:, 3]
+        ret[:, :2] -= ret[:, 2:] / 2
+        return ret
+
+    def tlbr(self, slots):
+        ret = self.tlwh(slots)
+        ret[:, 2:] += ret[:, :2]
+        return ret
@@ -0,0 +1 @@
+# Makes pytest put the repository root on sys.path, so the tests can import algorithm, byte_tracker and utils
@@ -1,5 +1,6 @@
 from algorithm.object_detector import YOLOv7
 from utils.detections import draw
+from utils.scheduler import FrameScheduler
 from tqdm import tqdm
 import cv2
 
@@ -21,39 +22,18 @@ if video.isOpened() == False:
 
 print('[+] started reading text on the video...\n')
 pbar = tqdm(total=frames_count, unit=' frames', dynamic_ncols=True, position=0, leave=True)
-texts = {}
+scheduler = FrameScheduler(fps=fps)
 
 try:
     while video.isOpened():
         ret, frame = video.read()
         if ret == True:
-            detections = yolov7.detect(frame, track=True)
-            
-            for detection in detections:
-                if detection['class'] in ocr_classes:
-                    detection_id = detection['id']
-                    text = detection['text']
-                    if len(text) > 0:
-                        if detection_id not in texts:
-                            texts[detection_id] = {
-                                'most_frequent':{
-                                    'value':'', 
-                                    'count':0
-                                }, 
-                                'all':{}
-                            }
-                        
-                        if text not in texts[detection_id]['all']:
-                            texts[detection_id]['all'][text] = 0
-                        
-                        texts[detection_id]['all'][text] += 1
-
-                        if texts[detection_id]['all'][text] > texts[detection_id]['most_frequent']['count']:
-                            texts[detection_id]['most_frequent']['value'] = text
-                            texts[detection_id]['most_frequent']['count'] = texts[detection_id]['all'][text]
-                
-                    if detection_id in texts:
-                        detection['text'] = texts[detection_id]['most_frequent']['value']
+            # texts are voted per track id inside detect(), plates are only re-read every few frames;
+            # frames skipped to keep up with the video get the tracker's predicted boxes
+            if scheduler.should_infer():
+                detections = scheduler.run(yolov7.detect, frame, track=True)
+            else:
+                detections = yolov7.predict_tracks()
 
             detected_frame = draw(frame, detections)
             output.write(detected_frame)
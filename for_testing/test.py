@@ -1,5 +1,6 @@
 from algorithm.object_detector import YOLOv7
 from utils.detections import draw
+from utils.scheduler import open_live_capture, read_latest
 import json
 import cv2
 
@@ -10,7 +11,8 @@ yolov7.set(ocr_classes=ocr_classes, conf_thres=0.7)  # Ustaw progi pewności na
 yolov7.load('best.weights', classes='classes.yaml', device='gpu')  # Użyj 'gpu' do inferencji na GPU CUDA
 
 # Inicjalizacja kamery
-webcam = cv2.VideoCapture(0)
+webcam = open_live_capture(0)
+fps = webcam.get(cv2.CAP_PROP_FPS) or 30
 
 if not webcam.isOpened():
     print('[!] Błąd podczas otwierania kamery')
@@ -22,7 +24,11 @@ detected_plates = set()
 with open('output.txt', 'a') as file:
     try:
         while webcam.isOpened():
-            ret, frame = webcam.read()
+            # Zawsze najświeższa klatka, zamiast klatek zbuforowanych w trakcie detekcji;
+            # tracker przesuwa się o faktycznie pominięte klatki, żeby czas filtru Kalmana się zgadzał
+            ret, frame, dropped = read_latest(webcam, 1.0 / fps)
+            for _ in range(dropped):
+                yolov7.predict_tracks()
             if ret:
                 # Wykrywanie obiektów na klatce
                 detections = yolov7.detect(frame, track=True)
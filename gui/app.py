@@ -1,30 +1,40 @@
 import sys
 from decimal import Decimal
 from enum import IntEnum
-from typing import Optional, Tuple
+from typing import List, Optional, Tuple
 
 import cv2
 from torch import cuda
 from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, \
     QLabel, QGridLayout, QPushButton, QFileDialog, QSizePolicy, QStackedWidget
 from PyQt5.QtGui import QImage, QPixmap, QFont
-from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtCore import Qt
 
 from algorithm.object_detector import YOLOv7
 
+from gui.frame_pipeline import FramePipeline
 from gui.screen_exit import ExitScreen
 from gui.screen_welcome import WelcomeScreen
 from gui.screen_message import MessageScreen, Messages
 
 from db.db_communicator import PostgresDatabaseCommunicator
 
+from utils.motion import MotionGate
+
 # Inicjalizacja detektora
 yolov7 = YOLOv7()
 ocr_classes = ['tablica', 'truck', 'motorcycle', 'car']
 yolov7.set(ocr_classes=ocr_classes, conf_thres=0.7)  # Ustawienie progów pewności
 # Wybór cpu/gpu
 device = 'cuda' if cuda.is_available() else 'cpu'
-yolov7.load('../best.weights', classes='../classes.yaml', device=device)
+# Zbudowany (po fuzji) model trafia do cache, kolejne uruchomienia pomijają fuzję
+yolov7.load('../best.weights', classes='../classes.yaml', device=device, model_cache='../.model_cache', mmap=True)
+
+# Obszar zainteresowania (wielokąt w pikselach klatki), None oznacza całą klatkę.
+# Detekcja uruchamia się tylko przy ruchu w tym obszarze i tylko na jego wycinku.
+MOTION_ROI: Optional[List[Tuple[int, int]]] = None
+motion_gate = MotionGate(roi=MOTION_ROI)
+last_recognition: Tuple[Optional[str], Optional[str]] = (None, None)
 
 
 def sanitize_license_plate(license_plate: str) -> str:
@@ -46,7 +56,9 @@ def sanitize_license_plate(license_plate: str) -> str:
 
 def recognize_vehicle(frame) -> Tuple[Optional[str], Optional[str]]:
     """
-    Funkcja przekazuje klatkę YOLOv7 i dostaje wynik
+    Funkcja przekazuje klatkę YOLOv7 i dostaje wynik.
+    Jeśli w obszarze zainteresowania nic się nie rusza, detekcja jest pomijana
+    i zwracany jest poprzedni wynik (scena się nie zmieniła).
 
     Args:
         frame:
@@ -55,8 +67,14 @@ def recognize_vehicle(frame) -> Tuple[Optional[str], Optional[str]]:
         Tuple[Optional[str], Optional[str]]: Numer rejestracyjny, typ pojazdu
 
     """
-    # Wykrywanie obiektów na klatce
-    detections = yolov7.detect(frame, track=True)
+    global last_recognition
+
+    if not motion_gate.update(frame):
+        return last_recognition
+
+    # Wykrywanie obiektów na wycinku klatki z obszarem zainteresowania
+    roi_frame, _ = motion_gate.crop(frame)
+    detections = yolov7.detect(roi_frame, track=True)
 
     vehicle_type: Optional[str] = None
     license_plate: Optional[str] = None
@@ -72,7 +90,8 @@ def recognize_vehicle(frame) -> Tuple[Optional[str], Optional[str]]:
         elif detection['class'] == 'motorcycle':
             vehicle_type = 'motorcycle'
 
-    return license_plate, vehicle_type
+    last_recognition = (license_plate, vehicle_type)
+    return last_recognition
 
 
 class ParkingApp(QMainWindow):
@@ -128,18 +147,23 @@ class ParkingApp(QMainWindow):
             self.load_video_button.setSizePolicy(QSizePolicy.Preferred, QSizePolicy.Preferred)
             self.load_video_button.clicked.connect(self.open_file_dialog)
             main_window_layout.addWidget(self.load_video_button, 5, 5, 1, 6)
-            self.cap = None
+            cap = None
         else:
-            self.cap = cv2.VideoCapture(0)
+            cap = cv2.VideoCapture(0)
 
         self.main_window_widget.setLayout(main_window_layout)
 
         self.stacked_widget.addWidget(self.main_window_widget)
 
-        # Zegar sondujący kamerkę/plik video
-        self.timer = QTimer(self)
-        self.timer.timeout.connect(self.update_frame)
-        self.timer.start(10)
+        # Przechwytywanie, detekcja i wyświetlanie działają w osobnych wątkach,
+        # więc wolny OCR nie blokuje interfejsu ani nie gubi klatek z kamerki
+        self.pipeline = FramePipeline(recognize_vehicle)
+        self.pipeline.capture_worker.stream_started.connect(self.on_stream_started)
+        self.pipeline.capture_worker.stream_ended.connect(self.on_stream_ended)
+        self.pipeline.display_worker.frame_ready.connect(self.show_frame)
+        self.pipeline.inference_worker.recognized.connect(self.on_recognition)
+        self.pipeline.set_capture(cap)
+        self.pipeline.start()
 
         # Flagi używane w celu uniemożliwienia zduplikowanych/nietrafnych wykryć
         # oraz w celu zamknięcia widżetów po odjeździe pojazdu
@@ -266,90 +290,90 @@ class ParkingApp(QMainWindow):
                 self.stacked_widget.removeWidget(widget)
                 widget.setParent(None)
 
-    @staticmethod
-    def get_resized_pixmap_from_frame(frame, width: int, height: int) -> QPixmap:
+    def show_frame(self, image: QImage) -> None:
         """
-        Funkcja zwraca pixmap o odpowiedniej wielkości na podstawie klatki video.
+        Funkcja wyświetla klatkę przygotowaną przez wątek wyświetlania.
 
         Args:
-            frame: Klatka video
-            width: Żądana szerokość
-            height: Żądana wysokość
+            image(QImage): Przeskalowana klatka video
 
         Returns:
-            QPixmap
+            None
 
         """
-        frame_resized = cv2.resize(frame, (width, height))
-        frame_resized = cv2.cvtColor(frame_resized, cv2.COLOR_BGR2RGB)
-        height, width, channel = frame_resized.shape
-        bytesPerLine = 3 * width
-        qImg = QImage(frame_resized.data, width, height, bytesPerLine, QImage.Format_RGB888)
-        pixmap = QPixmap.fromImage(qImg)
+        self.pipeline.display_worker.set_size(self.video_widget.width(), self.video_widget.height())
+        if self.playing_video and self.stacked_widget.currentIndex() == 0:
+            self.video_widget.setPixmap(QPixmap.fromImage(image))
 
-        return pixmap
+    def on_stream_started(self) -> None:
+        """
+        Funkcja uruchamia się po odczytaniu pierwszej klatki ze strumienia video.
+
+        Returns:
+            None
 
-    def update_frame(self) -> None:
         """
-        Funkcja uruchamia się przez QTimera i sprawdza obecność nowych klatek w strumieniu video,
-        uzyskuje dane od modelu i podejmuje działania po uzyskaniu danych.
+        self.playing_video = True
+        if hasattr(self, 'load_video_button'):
+            self.load_video_button.hide()
+
+    def on_recognition(self, license_plate: Optional[str], vehicle_type: Optional[str]) -> None:
+        """
+        Funkcja odbiera wynik rozpoznawania z wątku detekcji i podejmuje działania po uzyskaniu danych.
+
+        Args:
+            license_plate(Optional[str]): Numer rejestracyjny
+            vehicle_type(Optional[str]): Typ pojazdu
 
         Returns:
             None
 
         """
-        if self.cap is not None:
-            ret, frame = self.cap.read()
-            if ret:
-                if not self.playing_video:
-                    self.playing_video = True
-                    if hasattr(self, 'load_video_button'):
-                        self.load_video_button.hide()
-
-                if self.stacked_widget.currentIndex() == 0:
-                    pixmap = self.get_resized_pixmap_from_frame(
-                        frame,
-                        self.video_widget.width(),
-                        self.video_widget.height()
-                    )
-                    self.video_widget.setPixmap(pixmap)
-
-                license_plate, vehicle_type = recognize_vehicle(frame)
-
-                if license_plate is not None and vehicle_type is not None:
-                    license_plate = sanitize_license_plate(license_plate)
-
-                    if license_plate == self.previous_license_plate \
-                            and vehicle_type == self.previous_vehicle_type:
-                        self.frames_with_same_detection += 1
-                    else:
-                        self.frames_with_same_detection = 0
-
-                    # Przeciwdziałamy złej detekcji, przyjmyjemy tylko stabilnie wykrywane dane
-                    if self.frames_with_same_detection > 5:
-                        # Przeciwdziałamy powtórnej detekcji
-                        if not self.vehicle_already_detected:
-                            self.on_vehicle_detection(vehicle_type, license_plate)
-                        self.vehicle_already_detected = True
-
-                    self.previous_license_plate = license_plate
-                    self.previous_vehicle_type = vehicle_type
-                    self.frames_without_detection = 0
-                # W razie niewykrycia pojazdu
-                else:
-                    self.frames_without_detection += 1
-                    if self.frames_without_detection > 60:
-                        self.vehicle_already_detected = False
-                        self.close_all_screens()
-            # W razie braku klatek
+        if not self.playing_video:
+            return
+
+        if license_plate is not None and vehicle_type is not None:
+            license_plate = sanitize_license_plate(license_plate)
+
+            if license_plate == self.previous_license_plate \
+                    and vehicle_type == self.previous_vehicle_type:
+                self.frames_with_same_detection += 1
             else:
-                self.playing_video = False
+                self.frames_with_same_detection = 0
+
+            # Przeciwdziałamy złej detekcji, przyjmyjemy tylko stabilnie wykrywane dane
+            if self.frames_with_same_detection > 5:
+                # Przeciwdziałamy powtórnej detekcji
+                if not self.vehicle_already_detected:
+                    self.on_vehicle_detection(vehicle_type, license_plate)
+                self.vehicle_already_detected = True
+
+            self.previous_license_plate = license_plate
+            self.previous_vehicle_type = vehicle_type
+            self.frames_without_detection = 0
+        # W razie niewykrycia pojazdu
+        else:
+            self.frames_without_detection += 1
+            if self.frames_without_detection > 60:
                 self.vehicle_already_detected = False
                 self.close_all_screens()
-                self.frames_without_detection = 0
-                self.video_widget.setStyleSheet("background-color: black")
-                if hasattr(self, 'load_video_button'):
-                    self.load_video_button.show()
+
+    def on_stream_ended(self) -> None:
+        """
+        Funkcja uruchamia się w razie braku klatek w strumieniu video.
+
+        Returns:
+            None
+
+        """
+        self.playing_video = False
+        self.vehicle_already_detected = False
+        self.close_all_screens()
+        self.frames_without_detection = 0
+        self.video_widget.clear()
+        self.video_widget.setStyleSheet("background-color: black")
+        if hasattr(self, 'load_video_button'):
+            self.load_video_button.show()
 
     def open_file_dialog(self):
         """
@@ -366,16 +390,29 @@ class ParkingApp(QMainWindow):
         file, _ = QFileDialog.getOpenFileName(self, "Open Video File", "",
                                               "Video Files (*.mp4 *.avi *.mov);;All Files (*)", options=options)
         if file:
-            if self.cap is not None:
-                self.cap.release()
+            cap = cv2.VideoCapture(file)
 
-            self.cap = cv2.VideoCapture(file)
-
-            if self.cap.isOpened():
+            if cap.isOpened():
                 print(f"Wybrano plik: {file}")
             else:
                 print(f"Nie udało się otworzyć pliku: {file}")
 
+            self.pipeline.set_capture(cap)
+
+    def closeEvent(self, event) -> None:
+        """
+        Funkcja zatrzymuje wątki potoku video przy zamykaniu okna.
+
+        Args:
+            event: Zdarzenie zamknięcia okna
+
+        Returns:
+            None
+
+        """
+        self.pipeline.stop()
+        super().closeEvent(event)
+
 
 if __name__ == '__main__':
     app = QApplication(sys.argv)
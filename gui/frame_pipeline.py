@@ -0,0 +1,313 @@
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any, Callable, Optional
+
+import cv2
+from PyQt5.QtGui import QImage
+from PyQt5.QtCore import QThread, pyqtSignal
+
+
+class DropOldestQueue:
+    """
+    Ograniczona kolejka łącząca wątki potoku. Po przepełnieniu wyrzuca najstarszy element,
+    dzięki czemu konsument zawsze dostaje najświeższą klatkę.
+    """
+
+    def __init__(self, maxsize: int = 1):
+        """
+        Args:
+            maxsize(int): Maksymalna liczba elementów w kolejce
+        """
+        self.items = deque(maxlen=maxsize)
+        self.condition = threading.Condition()
+        self.dropped: int = 0
+
+    def put(self, item: Any) -> None:
+        """
+        Funkcja dodaje element do kolejki, w razie potrzeby wyrzucając najstarszy.
+
+        Args:
+            item(Any): Element
+
+        Returns:
+            None
+
+        """
+        with self.condition:
+            if len(self.items) == self.items.maxlen:
+                self.dropped += 1
+            self.items.append(item)
+            self.condition.notify()
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Any]:
+        """
+        Funkcja pobiera najstarszy element z kolejki.
+
+        Args:
+            timeout(Optional[float]): Maksymalny czas oczekiwania w sekundach
+
+        Returns:
+            Optional[Any]: Element lub None po upływie czasu oczekiwania
+
+        """
+        with self.condition:
+            if not self.condition.wait_for(lambda: len(self.items) > 0, timeout):
+                return None
+            return self.items.popleft()
+
+    def clear(self) -> None:
+        """
+        Funkcja usuwa wszystkie elementy z kolejki.
+
+        Returns:
+            None
+
+        """
+        with self.condition:
+            self.items.clear()
+
+
+class CaptureWorker(QThread):
+    """
+    Wątek czytający klatki ze źródła video i rozsyłający je do kolejek wyświetlania i detekcji.
+    """
+
+    stream_started = pyqtSignal()
+    stream_ended = pyqtSignal()
+
+    def __init__(self, *queues: DropOldestQueue):
+        """
+        Args:
+            queues(DropOldestQueue): Kolejki, do których trafia każda odczytana klatka
+        """
+        super().__init__()
+        self.queues = queues
+        self.cap: Optional[cv2.VideoCapture] = None
+        self.lock = threading.Lock()
+        self.running = True
+        self.playing = False
+
+    def set_capture(self, cap: Optional[cv2.VideoCapture]) -> None:
+        """
+        Funkcja podmienia źródło video, zamykając poprzednie.
+
+        Args:
+            cap(Optional[cv2.VideoCapture]): Otwarte źródło video
+
+        Returns:
+            None
+
+        """
+        with self.lock:
+            if self.cap is not None:
+                self.cap.release()
+            self.cap = cap
+
+    def stop(self) -> None:
+        """
+        Funkcja zatrzymuje wątek i zamyka źródło video.
+
+        Returns:
+            None
+
+        """
+        self.running = False
+        self.wait()
+        self.set_capture(None)
+
+    def run(self) -> None:
+        while self.running:
+            with self.lock:
+                cap = self.cap
+                ret, frame = cap.read() if cap is not None else (False, None)
+                # Pliki video odtwarzamy w ich własnym tempie, kamerka sama narzuca tempo
+                fps = cap.get(cv2.CAP_PROP_FPS) if cap is not None and cap.get(cv2.CAP_PROP_FRAME_COUNT) > 0 else 0
+
+            if ret:
+                started = time.monotonic()
+                if not self.playing:
+                    self.playing = True
+                    self.stream_started.emit()
+                for queue in self.queues:
+                    queue.put(frame)
+                if fps > 0:
+                    time.sleep(max(0.0, 1.0 / fps - (time.monotonic() - started)))
+            else:
+                if self.playing:
+                    self.playing = False
+                    self.stream_ended.emit()
+                time.sleep(0.01)
+
+
+class DisplayWorker(QThread):
+    """
+    Wątek przygotowujący klatki do wyświetlenia (skalowanie i konwersja kolorów).
+    """
+
+    frame_ready = pyqtSignal(QImage)
+
+    def __init__(self, queue: DropOldestQueue):
+        """
+        Args:
+            queue(DropOldestQueue): Kolejka z klatkami do wyświetlenia
+        """
+        super().__init__()
+        self.queue = queue
+        self.size = (640, 480)
+        self.running = True
+
+    def set_size(self, width: int, height: int) -> None:
+        """
+        Funkcja ustawia docelowy rozmiar wyświetlanych klatek.
+
+        Args:
+            width(int): Szerokość
+            height(int): Wysokość
+
+        Returns:
+            None
+
+        """
+        self.size = (max(1, width), max(1, height))
+
+    def stop(self) -> None:
+        """
+        Funkcja zatrzymuje wątek.
+
+        Returns:
+            None
+
+        """
+        self.running = False
+        self.wait()
+
+    @staticmethod
+    def get_resized_image_from_frame(frame, width: int, height: int) -> QImage:
+        """
+        Funkcja zwraca QImage o odpowiedniej wielkości na podstawie klatki video.
+
+        Args:
+            frame: Klatka video
+            width: Żądana szerokość
+            height: Żądana wysokość
+
+        Returns:
+            QImage
+
+        """
+        frame_resized = cv2.resize(frame, (width, height))
+        frame_resized = cv2.cvtColor(frame_resized, cv2.COLOR_BGR2RGB)
+        height, width, channel = frame_resized.shape
+        bytesPerLine = 3 * width
+        # Kopia, bo bufor numpy przestaje istnieć po wyjściu z funkcji
+        return QImage(frame_resized.data, width, height, bytesPerLine, QImage.Format_RGB888).copy()
+
+    def run(self) -> None:
+        while self.running:
+            frame = self.queue.get(timeout=0.1)
+            if frame is not None:
+                self.frame_ready.emit(self.get_resized_image_from_frame(frame, *self.size))
+
+
+class InferenceWorker(QThread):
+    """
+    Wątek uruchamiający rozpoznawanie pojazdu (YOLOv7, śledzenie, OCR) na najświeższej klatce.
+    """
+
+    recognized = pyqtSignal(object, object)
+
+    def __init__(self, queue: DropOldestQueue, recognize: Callable):
+        """
+        Args:
+            queue(DropOldestQueue): Kolejka z klatkami do detekcji
+            recognize(Callable): Funkcja zwracająca (numer rejestracyjny, typ pojazdu) dla klatki
+        """
+        super().__init__()
+        self.queue = queue
+        self.recognize = recognize
+        self.running = True
+
+    def stop(self) -> None:
+        """
+        Funkcja zatrzymuje wątek.
+
+        Returns:
+            None
+
+        """
+        self.running = False
+        self.wait()
+
+    def run(self) -> None:
+        while self.running:
+            frame = self.queue.get(timeout=0.1)
+            if frame is None:
+                continue
+            # Błąd na jednej klatce (model, OCR) nie może zakończyć wątku, bo rozpoznawanie stanęłoby na dobre
+            try:
+                license_plate, vehicle_type = self.recognize(frame)
+            except Exception:
+                print('Błąd rozpoznawania klatki:')
+                traceback.print_exc()
+                continue
+            self.recognized.emit(license_plate, vehicle_type)
+
+
+class FramePipeline:
+    """
+    Potok producent/konsument: przechwytywanie, detekcja i wyświetlanie działają w osobnych wątkach,
+    połączonych kolejkami z polityką wyrzucania najstarszej klatki. Wyniki trafiają do wątku Qt przez sygnały.
+    """
+
+    def __init__(self, recognize: Callable, queue_size: int = 1):
+        """
+        Args:
+            recognize(Callable): Funkcja zwracająca (numer rejestracyjny, typ pojazdu) dla klatki
+            queue_size(int): Pojemność kolejek między wątkami
+        """
+        self.display_queue = DropOldestQueue(queue_size)
+        self.inference_queue = DropOldestQueue(queue_size)
+        self.capture_worker = CaptureWorker(self.display_queue, self.inference_queue)
+        self.display_worker = DisplayWorker(self.display_queue)
+        self.inference_worker = InferenceWorker(self.inference_queue, recognize)
+
+    def start(self) -> None:
+        """
+        Funkcja uruchamia wszystkie wątki potoku.
+
+        Returns:
+            None
+
+        """
+        self.inference_worker.start()
+        self.display_worker.start()
+        self.capture_worker.start()
+
+    def stop(self) -> None:
+        """
+        Funkcja zatrzymuje wszystkie wątki potoku.
+
+        Returns:
+            None
+
+        """
+        self.capture_worker.stop()
+        self.display_worker.stop()
+        self.inference_worker.stop()
+
+    def set_capture(self, cap: Optional[cv2.VideoCapture]) -> None:
+        """
+        Funkcja ustawia nowe źródło video i czyści kolejki ze starymi klatkami.
+
+        Args:
+            cap(Optional[cv2.VideoCapture]): Otwarte źródło video
+
+        Returns:
+            None
+
+        """
+        self.capture_worker.set_capture(cap)
+        self.display_queue.clear()
+        self.inference_queue.clear()
@@ -1,5 +1,6 @@
 import numpy as np
 import random
+import json
 import torch
 import torch.nn as nn
 from models.common import Conv
@@ -236,6 +237,68 @@ class End2End(nn.Module):
         return x
 
 
+class ORTModel:
+    '''onnxruntime session for graphs exported with End2End + ONNX_ORT (NMS inside the graph).'''
+    def __init__(self, weights, device=None, threads=None, interop_threads=None):
+        import onnxruntime as ort  # optional dependency, only needed for .onnx weights
+        device = device if device else torch.device('cpu')
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        if interop_threads:
+            options.inter_op_num_threads = interop_threads
+        providers = ['CPUExecutionProvider']
+        if device.type != 'cpu' and 'CUDAExecutionProvider' in ort.get_available_providers():
+            providers.insert(0, 'CUDAExecutionProvider')
+        self.session = ort.InferenceSession(str(weights), sess_options=options, providers=providers)
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.batch_size = model_input.shape[0] if isinstance(model_input.shape[0], int) else None
+        h, w = model_input.shape[2:4]
+        self.img_size = (h, w) if isinstance(h, int) and isinstance(w, int) else None  # None for dynamic axes
+        meta = self.session.get_modelmeta().custom_metadata_map
+        self.stride = torch.tensor([float(meta.get('stride', 32))])
+        if self.img_size is None and 'img_size' in meta:
+            self.img_size = tuple(json.loads(meta['img_size']))
+
+    def __call__(self, img, conf_thres=0.0):
+        # img(n,3,h,w) -> list of (k,6) tensors [xyxy, conf, cls] per image, same as non_max_suppression()
+        x = img.float().cpu().numpy()
+        if self.batch_size is None or self.batch_size == len(x):
+            out = self.session.run(None, {self.input_name: x})[0]
+        else:  # graph exported with a fixed batch size, run the images one by one
+            out = []
+            for i in range(len(x)):
+                o = self.session.run(None, {self.input_name: x[i:i + 1]})[0]
+                o[:, 0] = i
+                out.append(o)
+            out = np.concatenate(out, 0) if len(out) else np.zeros((0, 7), dtype=np.float32)
+
+        out = torch.from_numpy(out)  # rows [batch index, x1, y1, x2, y2, cls, score]
+        out = out[out[:, 6] > conf_thres]
+        return [out[out[:, 0] == i][:, [1, 2, 3, 4, 6, 5]] for i in range(len(x))]
+
+
+class TorchScriptModel:
+    '''TorchScript module traced by algorithm/export.py, with the input shape and stride it was traced for.'''
+    def __init__(self, weights, device=None):
+        extra_files = {'config.txt': ''}
+        self.model = torch.jit.load(str(weights), map_location=device, _extra_files=extra_files)
+        config = json.loads(extra_files['config.txt'] or '{}')
+        self.stride = torch.tensor([float(config.get('stride', 32))])
+        self.img_size = tuple(config['img_size']) if 'img_size' in config else None
+        self.batch_size = config.get('batch_size')
+
+    def __call__(self, img):
+        img = img.float()
+        if self.batch_size is None or self.batch_size == len(img):
+            return self.model(img)
+        # traced for a fixed batch size, run the images one by one
+        return torch.cat([self.model(img[i:i + 1])[0] for i in range(len(img))], 0), None
+
+
 def attempt_load(weights, device=None, inplace=True, fuse=True):
     # Loads an ensemble of models weights=[a,b,c] or a single model weights=[a] or weights=a
     from models.yolo import Detect, Model
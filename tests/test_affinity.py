@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from algorithm import object_detector
+from algorithm.object_detector import YOLOv7
+from utils import torch_utils
+
+
+class Stop(Exception):
+    pass
+
+
+def test_detect_pins_the_thread_before_preprocessing(monkeypatch):
+    # The preprocessor's parallel ops start the thread's OpenMP pool, which keeps the cores it was started on
+    calls = []
+    monkeypatch.setattr(object_detector, 'set_affinity', lambda cores: calls.append(('pin', cores)))
+
+    def preprocess(images, **kwargs):
+        calls.append('preprocess')
+        raise Stop
+
+    yolov7 = YOLOv7()
+    yolov7.affinity = [0]
+    yolov7.preprocessor = preprocess
+    yolov7.fixed_shape = False
+    yolov7.imgsz = 640
+    for _ in range(2):
+        with pytest.raises(Stop):
+            yolov7.detect(np.zeros((48, 64, 3), dtype=np.uint8))
+    assert calls == [('pin', [0]), 'preprocess', 'preprocess']
+
+def test_load_runs_pinned_and_restores_the_caller(monkeypatch):
+    calls = []
+    monkeypatch.setattr(torch_utils, 'set_affinity', lambda cores: calls.append(('pin', cores)) or {0, 1, 2, 3})
+    monkeypatch.setattr(torch_utils.os, 'sched_setaffinity', lambda pid, cores: calls.append(('restore', cores)))
+
+    def attempt_load(weights, device=None):
+        calls.append('load')
+        raise Stop
+
+    monkeypatch.setattr(object_detector, 'attempt_load', attempt_load)
+    with pytest.raises(Stop):
+        YOLOv7().load('best.weights', 'classes.yaml', affinity=[2, 3])
+    assert calls == [('pin', [2, 3]), 'load', ('restore', {0, 1, 2, 3})]
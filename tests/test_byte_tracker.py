@@ -0,0 +1,71 @@
+import json
+
+import numpy as np
+
+from byte_tracker import BYTETracker
+from byte_tracker.base_track import TrackState
+from byte_tracker.track_archive import TrackArchive
+from utils.ocr_cache import OCRCache
+
+P = [100.0, 100.0, 160.0, 140.0]
+Q = [400.0, 300.0, 460.0, 340.0]
+
+
+def detections(*boxes):
+    return np.array([box + [0.9, 0.0] for box in boxes]).reshape(-1, 6)
+
+def forced_duplicate(tracker, cache):
+    # Two tracks for five frames, then Q goes lost and its lost track is moved onto P: the next frame holds a
+    # tracked/lost pair covering the same object, so one of them is dropped as a duplicate
+    for _ in range(5):
+        outputs = tracker.update(detections(P, Q))
+        for track_id in outputs[:, 4]:
+            cache.update(int(track_id), 'ABC123', 1.0, 100)
+        cache.evict(tracker.removed_ids)
+    ids = {int(track_id) for track_id in outputs[:, 4]}
+
+    tracker.update(detections(P))
+    cache.evict(tracker.removed_ids)
+    lost = tracker.lost_slots[0]
+    tracked = tracker.tracked_slots[0]
+    assert tracker.store.state[lost] == TrackState.Lost
+    tracker.store.mean[lost] = tracker.store.mean[tracked]
+    tracker.store.covariance[lost] = tracker.store.covariance[tracked]
+
+    tracker.update(detections(P))
+    cache.evict(tracker.removed_ids)
+    live = set(tracker.store.track_id[np.concatenate((tracker.tracked_slots, tracker.lost_slots))].tolist())
+    dropped = ids - live
+    assert len(dropped) == 1
+    return dropped.pop()
+
+
+def test_duplicate_track_is_evicted_from_ocr_cache():
+    tracker = BYTETracker()
+    cache = OCRCache()
+    dropped = forced_duplicate(tracker, cache)
+    assert dropped in tracker.removed_ids
+    assert dropped not in cache.entries
+
+def test_duplicate_track_is_archived_and_kept_in_history(tmp_path):
+    archive = TrackArchive(tmp_path / 'tracks.jsonl')
+    tracker = BYTETracker(archive=archive, name='gate')
+    dropped = forced_duplicate(tracker, OCRCache())
+    archive.close()
+
+    records = [json.loads(line) for line in (tmp_path / 'tracks.jsonl').read_text().splitlines()]
+    assert [record['id'] for record in records] == [dropped]
+    assert records[0]['stream'] == 'gate'
+    assert list(tracker.removed_track_ids) == [dropped]
+
+def test_low_score_detection_continues_its_track_without_high_score_detections():
+    # Second association stage: a low score detection keeps a tracked object tracked. The list-based tracker paired
+    # these detections with the classes of the high score ones and zip() dropped those past that count
+    tracker = BYTETracker()
+    for _ in range(3):
+        outputs = tracker.update(detections(P, Q))
+    track_id = outputs[0, 4]
+
+    outputs = tracker.update(np.array([P + [0.3, 0.0]]))
+    assert outputs[:, 4].tolist() == [track_id]
+    assert outputs[0, 6] == 0.3
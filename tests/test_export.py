@@ -0,0 +1,27 @@
+import torch
+
+from algorithm.export import verify
+
+
+def detections(n, seed):
+    g = torch.Generator().manual_seed(seed)
+    xy = torch.rand((n, 2), generator=g) * 600
+    return torch.cat((xy, xy + 20 + torch.rand((n, 2), generator=g) * 40, torch.rand((n, 1), generator=g), torch.zeros((n, 1))), 1)
+
+
+def test_one_box_flipped_at_a_threshold_does_not_fail_the_export():
+    reference = [detections(60, seed) for seed in range(10)]
+    outputs = [ref.clone() for ref in reference]
+    outputs[3] = outputs[3][1:]  # recall 0.983 on one frame
+    assert verify(reference, outputs, 'onnx')
+
+def test_a_frame_missing_many_boxes_fails_the_export():
+    reference = [detections(60, seed) for seed in range(10)]
+    outputs = [ref.clone() for ref in reference]
+    outputs[3] = outputs[3][:30]
+    assert not verify(reference, outputs, 'onnx')
+
+def test_mean_recall_must_reach_min_recall():
+    reference = [detections(60, seed) for seed in range(10)]
+    outputs = [ref[2:].clone() for ref in reference]  # 0.967 on every frame
+    assert not verify(reference, outputs, 'onnx')
@@ -0,0 +1,30 @@
+import numpy as np
+
+from byte_tracker import matching
+
+
+def bbox_overlaps(boxes, query_boxes):
+    # cython_bbox's loop, written out in Python
+    overlaps = np.zeros((len(boxes), len(query_boxes)))
+    for k, (qx1, qy1, qx2, qy2) in enumerate(query_boxes):
+        for n, (x1, y1, x2, y2) in enumerate(boxes):
+            iw = min(x2, qx2) - max(x1, qx1) + 1
+            ih = min(y2, qy2) - max(y1, qy1) + 1
+            if iw > 0 and ih > 0:
+                overlaps[n, k] = iw * ih / ((x2 - x1 + 1) * (y2 - y1 + 1) + (qx2 - qx1 + 1) * (qy2 - qy1 + 1) - iw * ih)
+    return overlaps
+
+
+def test_numpy_ious_matches_bbox_overlaps():
+    rng = np.random.default_rng(0)
+    xy = rng.uniform(0, 200, (40, 2))
+    boxes = np.column_stack((xy, xy + rng.uniform(0, 60, (40, 2))))
+    boxes[:3] = [[10, 10, 10, 10], [10, 10, 20, 20], [21, 10, 30, 20]]  # a point, and two boxes touching at x=20/21
+    a, b = boxes[:25], boxes[15:]
+    assert np.array_equal(matching.numpy_ious(a, b), bbox_overlaps(a, b))
+    assert np.array_equal(matching.ious(a, b), bbox_overlaps(a, b))
+
+def test_ious_accepts_lists_and_empty_inputs():
+    assert matching.ious([], [[0, 0, 9, 9]]).shape == (0, 1)
+    assert matching.ious([[0, 0, 9, 9]], np.empty((0, 4))).shape == (1, 0)
+    assert matching.ious([[0, 0, 9, 9]], [np.array([0, 0, 9, 9], dtype=np.float32)])[0, 0] == 1.0
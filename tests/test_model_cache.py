@@ -0,0 +1,21 @@
+import torch
+
+from utils import model_cache
+
+
+def fake_attempt_load(weights, device=None):
+    return torch.nn.Linear(2, 2)
+
+def test_rebuild_keeps_entries_of_same_named_weights_elsewhere(tmp_path, monkeypatch):
+    monkeypatch.setattr(model_cache, 'attempt_load', fake_attempt_load)
+    cache_dir = tmp_path / 'cache'
+    first, second = tmp_path / 'a' / 'best.weights', tmp_path / 'b' / 'best.weights'
+    for weights in (first, second):
+        weights.parent.mkdir()
+        weights.write_bytes(b'v1')
+        model_cache.load_fused_model(weights, torch.device('cpu'), cache_dir)
+    assert len(list(cache_dir.glob('*.pt'))) == 2
+
+    first.write_bytes(b'v2')  # retrained: the old entry of this file is stale, the other file's entry is not
+    model_cache.load_fused_model(first, torch.device('cpu'), cache_dir)
+    assert sorted(cache_dir.glob('*.pt')) == sorted([model_cache.cache_path(first, cache_dir), model_cache.cache_path(second, cache_dir)])
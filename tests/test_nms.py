@@ -0,0 +1,48 @@
+import torch
+
+from algorithm.export import match_detections
+from utils.general import non_max_suppression, non_max_suppression_fast
+
+
+def prediction(batch=2, anchors=4000, nc=4, objects=30, seed=0):
+    # Raw head output: low-confidence background plus clusters of overlapping candidates around each object
+    g = torch.Generator().manual_seed(seed)
+    pred = torch.rand((batch, anchors, 5 + nc), generator=g)
+    pred[..., :2] *= 640
+    pred[..., 2:4] = 4 + pred[..., 2:4] * 76
+    pred[..., 4] *= 0.5
+    for b in range(batch):
+        centers = torch.rand((objects, 2), generator=g) * 600 + 20
+        sizes = torch.rand((objects, 2), generator=g) * 100 + 20
+        rows = torch.randperm(anchors, generator=g)[:objects * 6]
+        pred[b, rows, :2] = centers.repeat_interleave(6, 0) + torch.randn((len(rows), 2), generator=g) * 2
+        pred[b, rows, 2:4] = sizes.repeat_interleave(6, 0) * (0.9 + 0.2 * torch.rand((len(rows), 2), generator=g))
+        pred[b, rows, 4] = 0.6 + 0.39 * torch.rand(len(rows), generator=g)
+        pred[b, rows, 5:] = 0.05
+        pred[b, rows, 5 + torch.arange(objects).repeat_interleave(6) % nc] = 0.95
+    return pred
+
+def first(detections, max_det=300):
+    # non_max_suppression() keeps up to 30000 boxes per image, the fast path max_det by confidence
+    return detections[detections[:, 4].argsort(descending=True)][:max_det]
+
+
+def test_fast_nms_matches_reference_by_iou():
+    # Class separation offsets differ (cls * max_wh against batched_nms' own), so float rounding can flip boxes
+    # right at iou_thres: the two are compared by IoU-matched recall, not for equality
+    for seed in range(3):
+        pred = prediction(seed=seed)
+        reference = non_max_suppression(pred.clone(), 0.25, 0.45)
+        fast = non_max_suppression_fast(pred.clone(), 0.25, 0.45, max_det=300)
+        for ref, out in zip(reference, fast):
+            ref = first(ref)
+            assert match_detections(ref, out)[0] >= 0.99
+            assert match_detections(out, ref)[0] >= 0.99
+
+def test_fast_nms_class_filter_and_topk():
+    pred = prediction()
+    reference = non_max_suppression(pred.clone(), 0.25, 0.45, classes=[1, 2], topk=500)
+    fast = non_max_suppression_fast(pred.clone(), 0.25, 0.45, classes=[1, 2], topk=500)
+    for ref, out in zip(reference, fast):
+        assert set(out[:, 5].tolist()) <= {1.0, 2.0}
+        assert match_detections(first(ref), out)[0] >= 0.99
@@ -0,0 +1,38 @@
+import numpy as np
+
+from algorithm.object_detector import YOLOv7
+
+
+class RecordingBackend:
+    def __init__(self):
+        self.calls = []
+
+    def read(self, image):
+        raise AssertionError('crops should go through read_batch')
+
+    def read_batch(self, images, detect_text=True):
+        self.calls.append((len(images), detect_text))
+        return [{'text': f'PL{i}', 'confidence': 0.9} for i in range(len(images))]
+
+
+def detection(cls, x):
+    return {'class': cls, 'x': x, 'y': 10, 'width': 40, 'height': 12}
+
+def recognize(yolov7, detections):
+    frame = np.zeros((100, 400, 3), dtype=np.uint8)
+    yolov7._YOLOv7__recognize_texts([(detections, frame)])
+
+
+def test_plate_crops_are_read_in_one_recognize_only_batch():
+    yolov7 = YOLOv7(ocr_classes=['tablica', 'car'])
+    yolov7.text_recognizer = RecordingBackend()
+    plates = [detection('tablica', 50 * i) for i in range(5)]
+    recognize(yolov7, plates)
+    assert yolov7.text_recognizer.calls == [(5, False)]
+    assert [d['text'] for d in plates] == [f'PL{i}' for i in range(5)]
+
+def test_other_classes_keep_text_detection():
+    yolov7 = YOLOv7(ocr_classes=['tablica', 'car'])
+    yolov7.text_recognizer = RecordingBackend()
+    recognize(yolov7, [detection('tablica', 0), detection('car', 100), detection('tablica', 200)])
+    assert yolov7.text_recognizer.calls == [(2, False), (1, True)]
@@ -0,0 +1,63 @@
+import threading
+
+import numpy as np
+
+from algorithm.object_detector import YOLOv7
+
+
+class BlockingBackend:
+    # Reads nothing until release is set, like a recognizer far slower than the detector
+    release = threading.Event()
+    batches = []
+
+    def warmup(self, background=False):
+        pass
+
+    def read_batch(self, images, detect_text=True):
+        self.release.wait(5)
+        BlockingBackend.batches.append(len(images))
+        return [{'text': 'PL1', 'confidence': 0.9} for _ in images]
+
+
+def detections(n, track_ids=None):
+    ids = track_ids if track_ids is not None else [None] * n
+    return [{'class': 'tablica', 'x': 40 * i, 'y': 10, 'width': 30, 'height': 12, **({'id': ids[i]} if ids[i] is not None else {})}
+            for i in range(n)]
+
+def drain(pool):
+    # One worker runs batches in order and their done callbacks before taking the next one
+    pool.executor.submit(lambda: None).result()
+
+def detector():
+    BlockingBackend.release.clear()
+    BlockingBackend.batches = []
+    yolov7 = YOLOv7(ocr_classes=['tablica'])
+    yolov7.set(ocr_async=True, ocr_workers=1, ocr_max_pending=2)
+    yolov7.recognizer_factory = BlockingBackend
+    yolov7.text_recognizer = BlockingBackend()
+    return yolov7
+
+
+def test_untracked_crops_are_skipped_while_the_pool_is_full():
+    yolov7 = detector()
+    frame = np.zeros((100, 400, 3), dtype=np.uint8)
+    for _ in range(15):
+        yolov7._YOLOv7__recognize_texts([(detections(8), frame)])
+    BlockingBackend.release.set()
+    yolov7.ocr_pool.shutdown(wait=True)
+    assert BlockingBackend.batches == [8, 8]
+
+def test_skipped_tracks_are_read_on_a_later_frame():
+    yolov7 = detector()
+    frame = np.zeros((100, 400, 3), dtype=np.uint8)
+    yolov7._YOLOv7__recognize_texts([(detections(8), frame)])
+    yolov7._YOLOv7__recognize_texts([(detections(8), frame)])
+    yolov7._YOLOv7__recognize_texts([(detections(2, track_ids=[1, 2]), frame)])
+    assert yolov7.ocr_cache.pending == set()
+    assert yolov7.ocr_cache.needs_read(1, 360)
+
+    BlockingBackend.release.set()
+    drain(yolov7.ocr_pool)
+    yolov7._YOLOv7__recognize_texts([(detections(2, track_ids=[1, 2]), frame)])
+    yolov7.ocr_pool.shutdown(wait=True)
+    assert yolov7.ocr_cache.get(1) == 'PL1'
@@ -0,0 +1,42 @@
+from utils import scheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def perf_counter(self):
+        return self.now
+
+
+class FakeCapture:
+    # `queued` frames are ready at once, every later grab waits `wait` seconds for the camera
+    def __init__(self, clock, queued, wait):
+        self.clock = clock
+        self.queued = queued
+        self.wait = wait
+        self.grabbed = 0
+
+    def grab(self):
+        if self.queued > 0:
+            self.queued -= 1
+            self.clock.now += 0.0001
+        else:
+            self.clock.now += self.wait
+        self.grabbed += 1
+        return True
+
+    def retrieve(self):
+        return True, self.grabbed
+
+
+def test_read_latest_drains_only_queued_frames(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(scheduler, 'time', clock)
+    cap = FakeCapture(clock, queued=3, wait=0.03)
+    ret, frame, dropped = scheduler.read_latest(cap, 1 / 30)
+    assert (ret, frame, dropped) == (True, 4, 3)  # one wait for a fresh frame, not one per dropped frame
+    assert clock.now < 0.03 + 0.001
+
+    ret, frame, dropped = scheduler.read_latest(cap, 1 / 30)
+    assert (frame, dropped) == (5, 0)
@@ -1,4 +1,5 @@
 import numpy as np
+import torch
 import cv2
 
 
@@ -32,4 +33,75 @@ def letterbox(img, new_shape=(640, 640), color=(114, 114, 114), auto=True, scale
     top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
     left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
     img = cv2.copyMakeBorder(img, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)  # add border
-    return img, ratio, (dw, dh)
\ No newline at end of file
+    return img, ratio, (dw, dh)
+
+class Preprocessor:
+    # Letterbox + BGR->RGB + HWC->CHW + /255 into buffers reused for every input resolution
+    def __init__(self, img_size, device, half=False, stride=32, color=(114, 114, 114), channels_last=False):
+        self.img_size = (img_size, img_size) if isinstance(img_size, int) else tuple(img_size)
+        self.device = device
+        self.half = half
+        self.channels_last = channels_last
+        self.stride = stride
+        self.color = color
+        self.geometries = {}  # (h, w, auto) -> letterbox geometry
+        self.resized = {}  # (h, w, auto) -> resize output buffer
+        self.tensors = {}  # (batch, h, w) -> host input tensor
+        self.slots = {}  # (batch, h, w, index) -> geometry last written into that batch slot
+
+    def __geometry(self, shape, auto):
+        key = (shape[0], shape[1], auto)
+        if key not in self.geometries:
+            # same arithmetic as letterbox(), so scale_coords() maps boxes back exactly
+            r = min(self.img_size[0] / shape[0], self.img_size[1] / shape[1])
+            new_unpad = int(round(shape[1] * r)), int(round(shape[0] * r))
+            dw, dh = self.img_size[1] - new_unpad[0], self.img_size[0] - new_unpad[1]
+            if auto:
+                dw, dh = np.mod(dw, self.stride), np.mod(dh, self.stride)
+            dw /= 2
+            dh /= 2
+            top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+            left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+            out_shape = new_unpad[1] + top + bottom, new_unpad[0] + left + right
+            self.geometries[key] = (new_unpad, top, left, out_shape)
+            if (shape[1], shape[0]) != new_unpad:
+                self.resized[key] = np.empty((new_unpad[1], new_unpad[0], 3), dtype=np.uint8)
+        return key, self.geometries[key]
+
+    def __tensor(self, batch, out_shape):
+        key = (batch,) + tuple(out_shape)
+        if key not in self.tensors:
+            pin = self.device.type != 'cpu'
+            if self.channels_last:  # NHWC storage behind an NCHW view, what channels_last convolutions expect
+                self.tensors[key] = torch.empty((batch,) + tuple(out_shape) + (3,), dtype=torch.float32, pin_memory=pin).permute(0, 3, 1, 2)
+            else:
+                self.tensors[key] = torch.empty((batch, 3) + tuple(out_shape), dtype=torch.float32, pin_memory=pin)
+        return key, self.tensors[key]
+
+    def __call__(self, images, auto=True, copy=False):
+        # Returns the (optionally copied) original frames and a (n,3,h,w) model input; the input buffer is reused by the next call
+        geometries = [self.__geometry(image.shape, auto) for image in images]
+        out_shapes = set(geometry[3] for _, geometry in geometries)
+        if len(out_shapes) != 1:
+            raise ValueError(f'frames letterbox to different shapes {out_shapes}, use auto=False to batch them')
+
+        tensor_key, tensor = self.__tensor(len(images), out_shapes.pop())
+        for i, (image, (key, (new_unpad, top, left, _))) in enumerate(zip(images, geometries)):
+            if key in self.resized:
+                image = cv2.resize(image, new_unpad, dst=self.resized[key], interpolation=cv2.INTER_LINEAR)
+            if self.slots.get(tensor_key + (i,)) != key:  # padding only has to be written when the slot geometry changes
+                for c in range(3):
+                    tensor[i, c].fill_(self.color[2 - c] / 255.0)
+                self.slots[tensor_key + (i,)] = key
+
+            src = torch.from_numpy(image)
+            dst = tensor[i, :, top:top + new_unpad[1], left:left + new_unpad[0]]
+            for c in range(3):
+                torch.div(src[:, :, 2 - c], 255.0, out=dst[c])  # BGR->RGB, HWC->CHW and normalization in one pass
+
+        if self.device.type != 'cpu':
+            tensor = tensor.to(self.device, non_blocking=True)
+            tensor = tensor.half() if self.half else tensor
+
+        im0s = [image.copy() for image in images] if copy else list(images)
+        return im0s, tensor
@@ -56,8 +56,9 @@ def clip_coords(boxes, img_shape):
     boxes[:, 2].clamp_(0, img_shape[1])  # x2
     boxes[:, 3].clamp_(0, img_shape[0])  # y2
 
-def non_max_suppression(prediction, conf_thres=0.25, iou_thres=0.45, agnostic=False, multi_label=False, labels=()):
-    """Runs Non-Maximum Suppression (NMS) on inference results
+def non_max_suppression(prediction, conf_thres=0.25, iou_thres=0.45, classes=None, agnostic=False, multi_label=False, labels=(), topk=None):
+    """Runs Non-Maximum Suppression (NMS) on inference results.
+    classes keeps only those class indices, topk caps the candidates per image going into NMS
 
     Returns:
          list of detections, on (n,6) tensor per image [xyxy, conf, cls]
@@ -94,16 +95,25 @@ def non_max_suppression(prediction, conf_thres=0.25, iou_thres=0.45, agnostic=Fa
         # Compute conf
         x[:, 5:] *= x[:, 4:5]  # conf = obj_conf * cls_conf
 
-        # Box (center x, center y, width, height) to (x1, y1, x2, y2)
-        box = xywh2xyxy(x[:, :4])
-
-        # Detections matrix nx6 (xyxy, conf, cls)
+        # Candidate rows i with class j and confidence conf
         if multi_label:
             i, j = (x[:, 5:] > conf_thres).nonzero(as_tuple=False).T
-            x = torch.cat((box[i], x[i, j + 5, None], j[:, None].float()), 1)
+            conf = x[i, j + 5]
         else:  # best class only
-            conf, j = x[:, 5:].max(1, keepdim=True)
-            x = torch.cat((box, conf, j.float()), 1)[conf.view(-1) > conf_thres]
+            conf, j = x[:, 5:].max(1)
+            i = (conf > conf_thres).nonzero(as_tuple=False).view(-1)
+            conf, j = conf[i], j[i]
+
+        # Filter by class and cap the candidates before any box is converted
+        if classes is not None:
+            k = (j[:, None] == torch.tensor(classes, device=j.device)).any(1)
+            i, j, conf = i[k], j[k], conf[k]
+        if topk is not None and i.shape[0] > topk:
+            k = conf.topk(topk)[1]
+            i, j, conf = i[k], j[k], conf[k]
+
+        # Detections matrix nx6 (xyxy, conf, cls), box (center x, center y, width, height) to (x1, y1, x2, y2)
+        x = torch.cat((xywh2xyxy(x[i, :4]), conf[:, None], j[:, None].float()), 1)
 
         # Check shape
         n = x.shape[0]  # number of boxes
@@ -127,6 +137,53 @@ def non_max_suppression(prediction, conf_thres=0.25, iou_thres=0.45, agnostic=Fa
 
     return output
 
+def _first_per_image(i, b, bs, k):
+    # i indexes rows sorted by confidence, b[i] their image: regroups i by image, keeping the first k of each
+    i = i[b[i].sort(stable=True)[1]]
+    counts = torch.bincount(b[i], minlength=bs)
+    rank = torch.arange(i.shape[0], device=i.device) - (counts.cumsum(0) - counts).repeat_interleave(counts)
+    return i[rank < k], counts.clamp(max=k)
+
+def non_max_suppression_fast(prediction, conf_thres=0.25, iou_thres=0.45, classes=None, agnostic=False, max_det=300, max_nms=30000, topk=None):
+    """Inference-only NMS over the whole batch: one candidate gather and one batched_nms call,
+    with image index and class as the NMS group so boxes never suppress across images or classes.
+    classes keeps only those class indices, topk caps the candidates per image going into NMS
+
+    Returns:
+         list of detections, on (n,6) tensor per image [xyxy, conf, cls], sorted by confidence
+    """
+    bs, nc = prediction.shape[0], prediction.shape[2] - 5
+    b, a = (prediction[..., 4] > conf_thres).nonzero(as_tuple=True)  # objectness candidates
+    x = prediction[b, a]
+    conf, j = x[:, 5:].mul_(x[:, 4:5]).max(1)  # conf = obj_conf * cls_conf, best class only
+    keep = conf > conf_thres
+    if classes is not None:
+        keep &= (j[:, None] == torch.tensor(classes, device=j.device)).any(1)
+    keep = keep.nonzero(as_tuple=True)[0]
+    cap = min(topk, max_nms) if topk is not None else max_nms
+    if keep.shape[0] > cap:  # some image may have excess boxes
+        keep, _ = _first_per_image(keep[conf[keep].argsort(descending=True)], b, bs, cap)
+    x, b, conf, j = x[keep], b[keep], conf[keep], j[keep]
+
+    out = torch.empty((x.shape[0], 6), device=prediction.device)
+    out[:, :4] = xywh2xyxy(x[:, :4])
+    out[:, 4] = conf
+    out[:, 5] = j
+    i = torchvision.ops.batched_nms(out[:, :4], conf, b if agnostic else b * nc + j, iou_thres)  # sorted by confidence
+
+    i, counts = _first_per_image(i, b, bs, max_det)
+    return list(out[i].split(counts.tolist()))
+
+def detections_to_numpy(det, img1_shape, img0_shape):
+    # Rescale (n,6) NMS output [xyxy, conf, cls] from img1_shape to img0_shape as a numpy array, in one transfer
+    if not len(det):
+        return np.empty((0, 6), float)
+    det = det.flip(0).double()  # highest confidence last, double so rounding matches python floats
+    scale_coords(img1_shape, det[:, :4], img0_shape)
+    det[:, :4] = det[:, :4].round()
+    det[:, 4] = det[:, 4].round(decimals=2)
+    return det.cpu().numpy()
+
 def crop(image, detection):
     x = detection['x']
     y = detection['y']
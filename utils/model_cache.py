@@ -0,0 +1,54 @@
+import hashlib
+import inspect
+import os
+from pathlib import Path
+
+import torch
+
+from models.experimental import attempt_load
+
+
+def file_hash(path, chunk_size=1 << 20):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+def source_prefix(weights):
+    # Entries of one weights file share this prefix: its stem plus a hash of its absolute path, so files with
+    # the same name in different directories never touch each other's entries
+    source = hashlib.sha256(str(Path(weights).resolve()).encode()).hexdigest()[:8]
+    return f'{Path(weights).stem}-{source}'
+
+def cache_path(weights, cache_dir):
+    # The key covers the checkpoint contents and the torch version, pickled modules are not portable across releases
+    key = hashlib.sha256(f'{file_hash(weights)}:{torch.__version__}'.encode()).hexdigest()[:16]
+    return Path(cache_dir) / f'{source_prefix(weights)}-{key}.pt'
+
+def load_fused_model(weights, device, cache_dir, mmap=False):
+    # Returns the fused FP32 eval model from attempt_load(), serialized to cache_dir on the first run.
+    # With mmap=True the cached tensors are mapped from disk instead of read into memory (torch>=2.1)
+    path = cache_path(weights, cache_dir)
+    params = inspect.signature(torch.load).parameters
+    kwargs = {'weights_only': False} if 'weights_only' in params else {}
+    if mmap and 'mmap' in params:
+        kwargs['mmap'] = True
+
+    if path.exists():
+        try:
+            model = torch.load(path, map_location='cpu', **kwargs)
+            return model.to(device)
+        except Exception as e:
+            print(f'[!] Model cache {path} is unreadable ({e}), rebuilding')
+
+    model = attempt_load(weights, device=torch.device('cpu'))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f'.{os.getpid()}.tmp')
+    torch.save(model, tmp)
+    os.replace(tmp, path)  # a crash mid-write never leaves a truncated cache entry behind
+
+    for stale in path.parent.glob(f'{source_prefix(weights)}-{"?" * 16}.pt'):  # older builds of the same file
+        if stale != path:
+            stale.unlink(missing_ok=True)
+    return model.to(device)
@@ -0,0 +1,82 @@
+import numpy as np
+import cv2
+
+
+class MotionGate:
+    # Cheap motion check on a downscaled region of interest, run before the detector
+    def __init__(self, roi=None, scale_width=160, threshold=25, min_area=0.002, hold_frames=15, method='diff'):
+        # roi: polygon [(x, y), ...] in frame pixels, None for the whole frame
+        # min_area: fraction of ROI pixels that must change to count as motion
+        # hold_frames: frames to keep reporting motion after it stops, so a vehicle that pulls up still gets detected
+        self.roi = None if roi is None else np.asarray(roi, dtype=np.int32).reshape(-1, 2)
+        self.scale_width = scale_width
+        self.threshold = threshold
+        self.min_area = min_area
+        self.hold_frames = hold_frames
+        self.method = method
+        self.shape = None
+        self.rect = None
+        self.mask = None
+        self.previous = None
+        self.subtractor = None
+        self.frames_since_motion = hold_frames + 1
+
+    def __setup(self, shape):
+        height, width = shape[:2]
+        if self.roi is None:
+            x0, y0, x1, y1 = 0, 0, width, height
+        else:
+            x, y, w, h = cv2.boundingRect(self.roi)
+            x0, y0 = max(x, 0), max(y, 0)
+            x1, y1 = min(x + w, width), min(y + h, height)
+        self.rect = x0, y0, x1, y1
+
+        scale = min(1.0, self.scale_width / max(x1 - x0, 1))
+        self.small_size = max(int(round((x1 - x0) * scale)), 1), max(int(round((y1 - y0) * scale)), 1)
+        self.mask = None
+        if self.roi is not None:
+            polygon = np.round((self.roi - [x0, y0]) * scale).astype(np.int32)
+            self.mask = np.zeros(self.small_size[::-1], dtype=np.uint8)
+            cv2.fillPoly(self.mask, [polygon], 255)
+        self.roi_pixels = cv2.countNonZero(self.mask) if self.mask is not None else self.small_size[0] * self.small_size[1]
+
+        self.shape = shape
+        self.previous = None
+        self.subtractor = cv2.createBackgroundSubtractorMOG2(detectShadows=False) if self.method == 'mog2' else None
+
+    def crop(self, frame):
+        # Returns a view of the ROI bounding box (no copy) and its (x, y) offset in the frame
+        if self.shape != frame.shape:
+            self.__setup(frame.shape)
+        x0, y0, x1, y1 = self.rect
+        return frame[y0:y1, x0:x1], (x0, y0)
+
+    def update(self, frame):
+        # True when the ROI changed since the previous frame (or within the last hold_frames frames)
+        roi_frame, _ = self.crop(frame)
+        small = cv2.resize(roi_frame, self.small_size, interpolation=cv2.INTER_AREA)
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        small = cv2.GaussianBlur(small, (5, 5), 0)
+
+        if self.subtractor is not None:
+            changed = self.subtractor.apply(small)
+        elif self.previous is None:
+            changed = None
+        else:
+            changed = cv2.absdiff(small, self.previous)
+            changed = cv2.threshold(changed, self.threshold, 255, cv2.THRESH_BINARY)[1]
+        self.previous = small
+
+        if changed is None:
+            motion = True  # first frame, nothing to compare against yet
+        else:
+            if self.mask is not None:
+                changed = cv2.bitwise_and(changed, self.mask)
+            motion = cv2.countNonZero(changed) > self.min_area * self.roi_pixels
+
+        self.frames_since_motion = 0 if motion else self.frames_since_motion + 1
+        return self.frames_since_motion <= self.hold_frames
+
+    def reset(self):
+        self.shape = None
+        self.frames_since_motion = self.hold_frames + 1
@@ -1,21 +1,118 @@
-from paddleocr import PaddleOCR
+import threading
+import numpy as np
 
-paddle_ocr = None
+backends = {}
+
+def register_backend(name):
+  def decorator(cls):
+    backends[name] = cls
+    return cls
+  return decorator
+
+def create_backend(name, **kwargs):
+  # Only the backend's own load() imports its OCR library, so unused backends are never imported
+  if name not in backends:
+    raise Exception(f'{name} is not a registered OCR backend, choose one of {list(backends.keys())}')
+  return backends[name](**kwargs)
+
+
+class OCRBackend:
+  def __init__(self):
+    self.model = None
+    self.lock = threading.Lock()
+
+  def load(self):
+    raise NotImplementedError
+
+  def get_model(self):
+    with self.lock:
+      if self.model is None:
+        self.model = self.load()
+    return self.model
+
+  def read(self, image):
+    raise NotImplementedError
+
+  def read_batch(self, images, detect_text=True):
+    return [self.read(image) for image in images]
+
+  def warmup(self, background=False):
+    # Builds the model and runs one dummy inference so no live request pays the first-call latency
+    if background:
+      thread = threading.Thread(target=self.warmup, daemon=True)
+      thread.start()
+      return thread
+    self.read(np.zeros((48, 160, 3), dtype=np.uint8))
+
+
+@register_backend('paddle')
+class PaddleBackend(OCRBackend):
+  def __init__(self, lang='en', use_angle_cls=True, rec_batch_num=16):
+    super().__init__()
+    self.lang = lang
+    self.use_angle_cls = use_angle_cls
+    self.rec_batch_num = rec_batch_num
+
+  def load(self):
+    from paddleocr import PaddleOCR
+    return PaddleOCR(use_angle_cls=self.use_angle_cls, lang=self.lang, show_log=False, rec_batch_num=self.rec_batch_num)
+
+  def read(self, image):
+    result = self.get_model().ocr(image, cls=self.use_angle_cls)
+    text = ''
+    scores = []
+
+    for idx in range(len(result)):
+      res = result[idx]
+      if res is None:
+        continue
+      for line in res:
+          if len(text) > 0:
+              text += '; '
+          text += f'{line[1][0]}'
+          scores.append(line[1][1])
+
+    return {'text': text, 'confidence': sum(scores) / len(scores) if len(scores) > 0 else 0.0}
+
+  def read_batch(self, images, detect_text=True):
+    if detect_text:
+      return [self.read(image) for image in images]
+
+    if len(images) == 0:
+      return []
+
+    # a nested list skips text detection and sends all crops through the angle classifier and recognizer as one batch
+    result = self.get_model().ocr([list(images)], det=False, cls=self.use_angle_cls)[0]
+    return [{'text': text, 'confidence': float(score)} for text, score in result]
+
+
+@register_backend('easy_paddle')
+class EasyPaddleBackend(OCRBackend):
+  def __init__(self, weights, device='cpu'):
+    super().__init__()
+    self.weights = weights
+    self.device = device
+
+  def load(self):
+    from easy_paddle_ocr import TextRecognizer
+    return TextRecognizer(weights=self.weights, device=self.device)
+
+  def read(self, image):
+    return self.get_model().read(image)
+
+
+default_backend = None
+
+def get_default_backend():
+  global default_backend
+
+  if default_backend is None:
+    default_backend = create_backend('paddle')
+
+  return default_backend
 
 def read(image):
-  global paddle_ocr
-
-  if paddle_ocr is None:
-    paddle_ocr = PaddleOCR(use_angle_cls=True, lang='en', show_log=False)
-  
-  result = paddle_ocr.ocr(image, cls=True)
-  text = ''
-
-  for idx in range(len(result)):
-    res = result[idx]
-    for line in res:
-        if len(text) > 0:
-            text += '; '
-        text += f'{line[1][0]}'
-  
-  return {'text': text}
\ No newline at end of file
+  return get_default_backend().read(image)
+
+def read_batch(images, detect_text=True):
+  return get_default_backend().read_batch(images, detect_text=detect_text)
@@ -0,0 +1,62 @@
+import threading
+
+
+class OCRCache:
+    # Per-track OCR results with confidence-weighted voting, so a plate is only re-read every few frames
+    def __init__(self):
+        self.entries = {}
+        self.pending = set()  # tracks with a background read in flight
+        self.lock = threading.RLock()
+
+    def needs_read(self, track_id, area, interval=10, growth=1.5):
+        # Counts one frame for the track and tells whether its crop should go through OCR again
+        with self.lock:
+            if track_id in self.pending:
+                return False
+            entry = self.entries.get(track_id)
+            if entry is None:
+                return True
+            entry['frames'] += 1
+            return entry['frames'] >= interval or area >= entry['area'] * growth
+
+    def mark_pending(self, track_id):
+        with self.lock:
+            self.pending.add(track_id)
+
+    def clear_pending(self, track_id):
+        # The read was not submitted after all, so the track is due again on its next frame
+        with self.lock:
+            self.pending.discard(track_id)
+
+    def update(self, track_id, text, confidence, area):
+        with self.lock:
+            self.pending.discard(track_id)
+            entry = self.entries.setdefault(track_id, {'votes':{}, 'frames':0, 'area':area})
+            entry['frames'] = 0
+            entry['area'] = area
+            if len(text) > 0 and not text.isspace():
+                entry['votes'][text] = entry['votes'].get(text, 0.0) + confidence
+
+    def resolve(self, track_id, text, confidence, area):
+        # Result of a background read; dropped if the track was evicted in the meantime
+        with self.lock:
+            if track_id in self.pending:
+                self.update(track_id, text, confidence, area)
+
+    def get(self, track_id):
+        with self.lock:
+            entry = self.entries.get(track_id)
+            if entry is None or len(entry['votes']) == 0:
+                return ''
+            return max(entry['votes'].items(), key=lambda vote: vote[1])[0]
+
+    def evict(self, track_ids):
+        with self.lock:
+            for track_id in track_ids:
+                self.entries.pop(track_id, None)
+                self.pending.discard(track_id)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.pending.clear()
@@ -0,0 +1,74 @@
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import numpy as np
+import threading
+
+_worker = threading.local()
+
+def _init_worker(recognizer_factory):
+    # Runs once in every pool thread/process: build its own recognizer and pay the first-call cost up front
+    _worker.recognizer = recognizer_factory()
+    try:
+        if hasattr(_worker.recognizer, 'warmup'):
+            _worker.recognizer.warmup()
+        else:
+            _worker.recognizer.read(np.zeros((48, 160, 3), dtype=np.uint8))
+    except:
+        pass
+
+def read_texts(recognizer, crops, detect_text=True):
+    # Reads every crop, batched when the recognizer supports it; failures give an empty text
+    if hasattr(recognizer, 'read_batch'):
+        try:
+            return recognizer.read_batch(crops, detect_text=detect_text)
+        except:
+            return [{'text':''} for _ in crops]
+
+    results = []
+    for cropped_box in crops:
+        try:
+            results.append(recognizer.read(cropped_box))
+        except:
+            results.append({'text':''})
+    return results
+
+def _read_batch(crops, detect_text):
+    return read_texts(_worker.recognizer, crops, detect_text)
+
+def _noop():
+    pass
+
+
+class OCRWorkerPool:
+    # Thread or process pool of warmed-up recognizers; recognizer_factory must be picklable for processes.
+    # At most max_pending batches (default two per worker) are queued or running, so a slow recognizer cannot
+    # build up an unbounded backlog of crops
+    def __init__(self, recognizer_factory, workers=1, processes=False, max_pending=None):
+        executor = ProcessPoolExecutor if processes else ThreadPoolExecutor
+        self.workers = workers
+        self.executor = executor(max_workers=workers, initializer=_init_worker, initargs=(recognizer_factory,))
+        self.slots = threading.BoundedSemaphore(max_pending if max_pending is not None else 2 * workers)
+
+    def warmup(self, background=False):
+        # Starts the workers so their recognizers are built before the first plate arrives
+        if background:
+            thread = threading.Thread(target=self.warmup, daemon=True)
+            thread.start()
+            return thread
+        for future in [self.executor.submit(_noop) for _ in range(self.workers)]:
+            future.result()
+
+    def submit(self, crops, detect_text=True):
+        # None when max_pending batches are already in flight, the caller skips this one. Accepted crops are
+        # copied, as the caller may reuse the frame buffer
+        if not self.slots.acquire(blocking=False):
+            return None
+        try:
+            future = self.executor.submit(_read_batch, [cropped_box.copy() for cropped_box in crops], detect_text)
+        except:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        return future
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
@@ -0,0 +1,94 @@
+import contextlib
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+
+import numpy as np
+
+# Prometheus histogram bucket bounds in seconds
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+_disabled = contextlib.nullcontext()
+
+
+class _Stage:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Profiler:
+    # Per-stage wall-clock timings: a rolling window for percentiles plus cumulative Prometheus histograms.
+    # Disabled, stage() hands back a shared no-op context, so instrumented code costs one attribute check per stage
+    def __init__(self, enabled=False, window=1000, buckets=DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.window = window
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.reset()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self.lock:
+            self.samples = {}  # stage -> deque of the last `window` durations
+            self.counts = {}  # stage -> per-bucket counts, last one is +Inf
+            self.sums = {}
+            self.totals = {}
+
+    def stage(self, name):
+        # with profiler.stage('nms'): ...
+        return _Stage(self, name) if self.enabled else _disabled
+
+    def record(self, name, seconds):
+        with self.lock:
+            if name not in self.samples:
+                self.samples[name] = deque(maxlen=self.window)
+                self.counts[name] = [0] * (len(self.buckets) + 1)
+                self.sums[name] = 0.0
+                self.totals[name] = 0
+            self.samples[name].append(seconds)
+            self.counts[name][bisect_left(self.buckets, seconds)] += 1
+            self.sums[name] += seconds
+            self.totals[name] += 1
+
+    def summary(self):
+        # {stage: {count, mean, p50, p90, p99, max}} in milliseconds over the rolling window
+        with self.lock:
+            samples = {name: np.array(values) * 1000 for name, values in self.samples.items() if len(values) > 0}
+        return {name: {'count': len(ms), 'mean': float(ms.mean()), 'p50': float(np.percentile(ms, 50)),
+                       'p90': float(np.percentile(ms, 90)), 'p99': float(np.percentile(ms, 99)), 'max': float(ms.max())}
+                for name, ms in samples.items()}
+
+    def to_prometheus(self, metric='yolov7_stage_seconds', labels=None):
+        # Text exposition format, one histogram series per stage
+        extra = ''.join(f',{key}="{value}"' for key, value in (labels or {}).items())
+        lines = [f'# HELP {metric} Wall-clock time spent in each detection pipeline stage.', f'# TYPE {metric} histogram']
+        with self.lock:
+            for name in sorted(self.counts):
+                cumulative = np.cumsum(self.counts[name])
+                for bound, count in zip(self.buckets + ('+Inf',), cumulative):
+                    lines.append(f'{metric}_bucket{{stage="{name}"{extra},le="{bound}"}} {count}')
+                lines.append(f'{metric}_sum{{stage="{name}"{extra}}} {self.sums[name]}')
+                lines.append(f'{metric}_count{{stage="{name}"{extra}}} {self.totals[name]}')
+        return '\n'.join(lines) + '\n'
+
+    def format(self):
+        # One line per stage for logs
+        return '\n'.join(f"{name}: n={s['count']} mean={s['mean']:.2f}ms p50={s['p50']:.2f}ms p90={s['p90']:.2f}ms "
+                         f"p99={s['p99']:.2f}ms max={s['max']:.2f}ms" for name, s in sorted(self.summary().items()))
@@ -0,0 +1,60 @@
+import copy
+import platform
+from pathlib import Path
+
+import cv2
+import torch
+import torch.nn as nn
+from torch.ao.quantization import DeQuantStub, QuantStub, convert, get_default_qconfig, prepare
+
+from models.common import Conv
+from utils.datasets import Preprocessor
+
+IMAGE_SUFFIXES = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+class QuantizedConv(nn.Module):
+    # Runs the wrapped (BN-fused) convolution in INT8, activations around it stay FP32 since SiLU has no INT8 kernel
+    def __init__(self, conv):
+        super(QuantizedConv, self).__init__()
+        self.quant = QuantStub()
+        self.conv = conv
+        self.dequant = DeQuantStub()
+
+    def forward(self, x):
+        return self.dequant(self.conv(self.quant(x)))
+
+
+def default_engine():
+    engines = torch.backends.quantized.supported_engines
+    if platform.machine().lower() in ('arm64', 'aarch64') and 'qnnpack' in engines:
+        return 'qnnpack'
+    return 'x86' if 'x86' in engines else 'fbgemm'
+
+def load_calibration_frames(directory, limit=None):
+    paths = sorted(p for p in Path(directory).iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)[:limit]
+    frames = [cv2.imread(str(p)) for p in paths]
+    frames = [f for f in frames if f is not None]
+    assert len(frames) > 0, f'No calibration images found in {directory}'
+    return frames
+
+def quantize_model(model, frames, img_size, stride=32, engine=None):
+    # Static post-training quantization of every Conv layer of a fused FP32 model, the model itself is left untouched.
+    # Observers record activation ranges over the calibration frames, then convert() swaps in the INT8 kernels
+    engine = engine or default_engine()
+    torch.backends.quantized.engine = engine
+
+    model = copy.deepcopy(model).cpu().float().eval()
+    model.qconfig = None
+    for m in model.modules():
+        if isinstance(m, Conv) and isinstance(m.conv, nn.Conv2d):
+            m.conv = QuantizedConv(m.conv)
+            m.conv.qconfig = get_default_qconfig(engine)
+    prepare(model, inplace=True)
+
+    preprocessor = Preprocessor(img_size, torch.device('cpu'), stride=stride)
+    with torch.no_grad():
+        for frame in frames:
+            model(preprocessor([frame], auto=False)[1])
+
+    return convert(model, inplace=True)
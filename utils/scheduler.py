@@ -0,0 +1,53 @@
+import math
+import time
+import cv2
+
+
+class FrameScheduler:
+    # Picks an inference stride from measured detect() latency so processing keeps pace with the camera
+    def __init__(self, fps=30, smoothing=0.2, max_stride=15):
+        self.frame_time = 1.0 / fps if fps and fps > 0 else 1.0 / 30
+        self.smoothing = smoothing
+        self.max_stride = max_stride
+        self.latency = None  # exponential moving average, seconds
+        self.stride = 1
+        self.frames_since_inference = 0
+
+    def should_infer(self):
+        # Called once per frame; True when this frame should go through the detector
+        self.frames_since_inference += 1
+        if self.frames_since_inference >= self.stride:
+            self.frames_since_inference = 0
+            return True
+        return False
+
+    def record(self, latency):
+        self.latency = latency if self.latency is None else self.smoothing * latency + (1 - self.smoothing) * self.latency
+        self.stride = min(max(math.ceil(self.latency / self.frame_time), 1), self.max_stride)
+
+    def run(self, function, *args, **kwargs):
+        # Calls function (e.g. YOLOv7.detect) and records how long it took
+        started = time.perf_counter()
+        result = function(*args, **kwargs)
+        self.record(time.perf_counter() - started)
+        return result
+
+
+def read_latest(cap, frame_time, max_frames=30):
+    # Reads the newest frame of a live cv2.VideoCapture, dropping the ones that queued up while the caller was busy.
+    # grab() of a queued frame returns at once (it does not decode); the first grab that has to wait for the camera
+    # delivers a fresh frame, so at most one frame period is spent waiting. Returns (ret, frame, dropped frames)
+    dropped = 0
+    while True:
+        started = time.perf_counter()
+        if not cap.grab():
+            return False, None, dropped
+        if time.perf_counter() - started > frame_time / 4 or dropped >= max_frames:
+            ret, frame = cap.retrieve()
+            return ret, frame, dropped
+        dropped += 1
+
+def open_live_capture(source):
+    cap = cv2.VideoCapture(source)
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # fewer frames to drain in read_latest, on backends that honour it
+    return cap
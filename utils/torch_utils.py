@@ -1,11 +1,47 @@
 import torch.nn.functional as F
 import torch.nn as nn
+import contextlib
 import math
+import os
 import torch
 
 
-def select_device(device='cpu', batch_size=None):
+def set_affinity(cores):
+    # Pins the calling thread only. Threads it starts afterwards inherit the set, but torch's OpenMP workers are
+    # started by the thread's first parallel op and keep the cores they had then, so pin before any torch work.
+    # Returns the previous set, None where affinity is not supported
+    if not hasattr(os, 'sched_setaffinity'):
+        print('[!] CPU affinity is not supported on this platform, ignoring it')
+        return None
+    previous = os.sched_getaffinity(0)
+    os.sched_setaffinity(0, set(cores))
+    return previous
+
+@contextlib.contextmanager
+def pinned(cores):
+    # Runs the block on cores and then gives the calling thread its own set back; worker threads started inside
+    # the block (an OpenMP pool, an onnxruntime session's pool) stay on cores
+    previous = set_affinity(cores) if cores is not None else None
+    try:
+        yield
+    finally:
+        if previous is not None:
+            os.sched_setaffinity(0, previous)
+
+def select_device(device='cpu', batch_size=None, threads=None, interop_threads=None, affinity=None):
+    # threads/interop_threads: intra-op and inter-op pool sizes, affinity: cores the calling thread is pinned to
+    if threads is not None:
+        torch.set_num_threads(threads)
+    if interop_threads is not None and interop_threads != torch.get_num_interop_threads():
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError:  # only allowed once, before any inter-op parallel work
+            print(f'[!] inter-op threads are already fixed at {torch.get_num_interop_threads()}')
+    if affinity is not None:
+        set_affinity(affinity)
+
     cpu = device.lower() == 'cpu'
+    index = int(device.split(':')[1]) if ':' in device else 0  # 'cuda:1' / 'gpu:1' selects a specific GPU
     
     if not cpu and not torch.cuda.is_available():
         raise Exception('no CUDA installation found on this machine.')
@@ -16,10 +52,20 @@ def select_device(device='cpu', batch_size=None):
         n = torch.cuda.device_count()
         if n == 0:
             raise Exception('no GPU found on this machine.')
+        if index >= n:
+            raise Exception(f'GPU {index} not found, {n} visible on this machine.')
         if n > 1 and batch_size:  # check that batch_size is compatible with device_count
             assert batch_size % n == 0, f'batch-size {batch_size} not multiple of GPU count {n}'
 
-    return torch.device('cuda:0' if cuda else 'cpu')
+    return torch.device(f'cuda:{index}' if cuda else 'cpu')
+
+def select_devices(devices=None):
+    # Devices for multi-device inference: the given names, otherwise every visible GPU, otherwise the CPU
+    if devices is not None:
+        return [select_device(device) for device in devices]
+    if torch.cuda.is_available() and torch.cuda.device_count() > 0:
+        return [torch.device(f'cuda:{i}') for i in range(torch.cuda.device_count())]
+    return [torch.device('cpu')]
 
 def initialize_weights(model):
     for m in model.modules():